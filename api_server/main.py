@@ -1,24 +1,162 @@
+import datetime
+import functools
+import inspect
+import io
 import json
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from server.gcs_client import *
+from server.storage_backends import *
+from server.http_cache import *
+from server.checkpoint import *
+from server.game_log_partitions import *
 from server.get_nba_attendance_v2 import *
+from server.streaming import *
+from server.serialization import *
+from server.artifacts import *
+from server.jobs import *
+from server.single_flight import *
+from server.leases import *
 from server.seatgeek_api_data import *
 from server.get_game_data import *
+from server.game_facts import *
+from server.game_query import *
 from server.async_get_game_id import *
+from server.game_id_index import *
 from server.get_game_id_api_mod import *
 from server.define_variables import *
-from google.oauth2 import service_account
-from google.cloud import storage
 
-app = FastAPI()
 
-class GcsStringUpload(BaseModel):
-    service_account_key: str
-    project_id: str
-    bucket_name: str
-    file_name: str
-    data: str
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the game query store before serving, if facts were published
+    try:
+        await run_in_threadpool(game_queries.get)
+    except Exception as e:
+        print("Loading the game facts failed:", e)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+artifact_cache = LocalArtifactCache(artifact_cache_dir)
+job_runner = JobRunner(max_workers=job_workers, queue_limit=job_queue_limit,
+                       history=job_history)
+# Identical endpoint requests, and runs of the work behind them, in
+# flight; kept apart as an endpoint and its work may share a name
+endpoint_flights = SingleFlight()
+work_flights = SingleFlight()
+
+store = make_storage_backend(storage_backend,
+                             project_id=project_id,
+                             service_account_key=service_account_file_path,
+                             bucket_name=bucket_name,
+                             local_dir=local_storage_dir,
+                             compression=gcs_compression,
+                             chunk_size=gcs_upload_chunk_bytes)
+published_artifacts = PublishedArtifactCache(store, artifact_serve_ttl_seconds)
+game_queries = GameQueryCache(published_artifacts)
+
+
+def coalesced(kind: str):
+    '''
+    Decorates a refresh endpoint so that identical requests (same
+    parameters, whatever crontab) arriving while one is running attach
+    to it and get its response. The work behind the endpoints is kept
+    from overlapping separately, see run_exclusive.
+    '''
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def refresh(crontab: bool = False, **params):
+            key = "-".join([kind] + [f"{name}={value}"
+                                     for name, value in sorted(params.items())])
+            result = endpoint_flights.do(key, lambda: endpoint(crontab=False, **params))
+            return None if crontab else result
+        return refresh
+    return decorator
+
+
+def run_exclusive(work: str, fn, variant: str = None):
+    '''
+    Runs fn as a run of a piece of work shared by several endpoints
+    (e.g. "bref_scrape", the basketball-reference scrape) while holding
+    the storage lease leases/<work>.json, so no other run of it
+    overlaps, in this instance or another and whatever its variant;
+    those answer 409 with Retry-After. Calls of the same work and
+    variant arriving while one is running here attach to it instead.
+    '''
+    def run():
+        try:
+            with StorageLease(store, work, ttl_seconds=lease_ttl_seconds).held():
+                return fn()
+        except LeaseHeld as e:
+            expires_at = e.holder["expires_at"] if e.holder else time.time() + lease_ttl_seconds
+            raise HTTPException(status_code=409, detail=str(e),
+                                headers={"Retry-After": str(max(int(expires_at - time.time()), 1))})
+
+    return work_flights.do(work if variant is None else f"{work}-{variant}", run)
+
+
+def serves_published(file_name: str, ndjson_fields: tuple):
+    '''
+    Decorates a refresh endpoint so that a GET serves the published
+    file_name from memory (see PublishedArtifactCache) with its ETag,
+    answering 304 when the client's If-None-Match already names it,
+    and only refreshes it with refresh=true or crontab=true.
+
+    The refresh returns the file as an EncodedJsonObject, rendered
+    here as json, or with ndjson=true as one line per member with the
+    field names ndjson_fields, streamed as it is encoded.
+    '''
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def serve(request: Request = None, refresh: bool = False,
+                  ndjson: bool = False, crontab: bool = False, **params):
+            if refresh or crontab:
+                try:
+                    result = endpoint(crontab=crontab, **params)
+                finally:
+                    published_artifacts.invalidate(file_name)
+                if not isinstance(result, EncodedJsonObject):
+                    return result
+                if ndjson:
+                    return StreamingResponse(result.iter_ndjson(*ndjson_fields),
+                                             media_type="application/x-ndjson")
+                return Response(content=result.to_bytes(), media_type="application/json",
+                                headers={"Content-Disposition": f"attachment; filename={file_name}"})
+            artifact = published_artifacts.get(file_name)
+            if artifact is None:
+                raise HTTPException(status_code=404,
+                                    detail=f"{file_name} hasn't been published yet; "
+                                           "refresh it with ?refresh=true or a POST")
+            body, etag = artifact
+            if ndjson:
+                etag = etag[:-1] + '-ndjson"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if request is not None and etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            if ndjson:
+                return StreamingResponse(iter_ndjson(loads_json(body), *ndjson_fields),
+                                         media_type="application/x-ndjson", headers=headers)
+            headers["Content-Disposition"] = f"attachment; filename={file_name}"
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        # FastAPI reads the query parameters from the signature
+        signature = inspect.signature(endpoint)
+        serve.__signature__ = signature.replace(parameters=[
+            inspect.Parameter("request", inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                              annotation=Request),
+            inspect.Parameter("refresh", inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                              default=False, annotation=bool),
+            inspect.Parameter("ndjson", inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                              default=False, annotation=bool),
+            *signature.parameters.values()])
+        return serve
+    return decorator
 
 
 @app.get("/")
@@ -27,97 +165,128 @@ def root():
             "Read the docs and submit a request for the data you want."}
 
 
+@app.get("/storage_client_stats")
+def get_storage_client_stats():
+    """
+    How many storage clients this instance built, what that cost and
+    how often the cached client was used instead since startup, with
+    a rough upper bound of the setup that saved.
+    """
+    return storage_client_stats()
+
+
 @app.get("/retrieve_nba_attendance_data_as_json_file")
-def get_nba_attendance_data_as_json(crontab = False):
+@serves_published("nba_attendance_data.json", ("team", "games"))
+@coalesced("nba_attendance")
+def get_nba_attendance_data_as_json(crontab: bool = False, incremental: bool = False,
+                                    stream: bool = False):
     '''
-    Gets NBA attendance data and returns a json. Saves
-    json into GCS bucket as well.
+    Returns the published NBA attendance json. With refresh
+    (or crontab), first scrapes the attendance data and
+    saves the json into GCS bucket. With incremental, only the
+    current season is re-scraped and merged into the
+    previously published json. With stream, each month is
+    written straight into the GCS object as it is scraped,
+    and a summary is returned instead of the json.
     '''
-    team_dict = create_team_dictionary_from_web()
-    json_response = JSONResponse(
-        content=team_dict,
-        media_type="application/json",
-        headers={"Content-Disposition": "attachment; filename=nba_attendance_data.json"})
-    try:
-        gcs_info = {"service_account_key": service_account_file_path,
-                    "project_id": project_id,
-                    "bucket_name": bucket_name,
-                    "file_name": "nba_attendance_data.json",
-                    "data": json.dumps(team_dict)}
-        save_to_gcs(GcsStringUpload(**gcs_info))
-    except Exception as e:
-        print("GCS upload failed:", e)
-        raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+    if stream:
+        if incremental:
+            raise HTTPException(status_code=400,
+                                detail="stream and incremental can't be combined")
+        job_stage("scrape and upload")
+        try:
+            teams = stream_nba_attendance_data_to_gcs()
+        except HTTPException:
+            raise
+        except Exception as e:
+            print("Streaming scrape failed:", e)
+            raise HTTPException(status_code=500,
+                                detail=f"Something went wrong: {e}")
+        if crontab:
+            return None
+        return {"json": "nba_attendance_data.json",
+                "message": f"Streamed attendance data of {teams} teams to GCS"}
+    _, team_json = refresh_nba_attendance(incremental)
     if crontab:
         return None
-    return json_response
+    return team_json
     
 
 @app.get("/retrieve_seatgeek_api_data_as_json_file")
-def get_seatgeek_api_data(crontab = False):
+@serves_published("seatgeek_api_data.json", ("team", "popularity"))
+@coalesced("seatgeek")
+def get_seatgeek_api_data(crontab: bool = False):
     '''
-    Gets team popularity info from Seatgeek API
-    and returns a map as a json. Saves file
-    into GCS bucket as well.
+    Returns the published team popularity map json. With
+    refresh (or crontab), first gets the team popularity
+    info from Seatgeek API and saves the file into GCS bucket.
     '''
-    try:
-        data = call_seatgeek_api()
-        team_popularity_map = create_team_popularity_map(data)
-    except Exception as e:
-        print("SeatGeek API Error, "
-              "check .env variables and authentication with SeatGeek.")
-        raise HTTPException(status_code=500,
-                            detail=f"Something went wrong: {str(e)}")
-    json_response = JSONResponse(
-        content=team_popularity_map,
-        media_type="application/json",
-        headers={"Content-Disposition": "attachment; filename=seatgeek_api_data.json"})
-    try:
-        gcs_info = {"service_account_key": service_account_file_path,
-                    "project_id": project_id,
-                    "bucket_name": bucket_name,
-                    "file_name": "seatgeek_api_data.json",
-                    "data": json.dumps(team_popularity_map)}
-        save_to_gcs(GcsStringUpload(**gcs_info))
-    except Exception as e:
-        print("GCS upload failed:", str(e))
-        raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+    def fetch_and_upload():
+        job_stage("fetch")
+        try:
+            data = call_seatgeek_api()
+            team_popularity_map = create_team_popularity_map(data)
+        except Exception as e:
+            print("SeatGeek API Error, "
+                  "check .env variables and authentication with SeatGeek.")
+            raise HTTPException(status_code=500,
+                                detail=f"Something went wrong: {str(e)}")
+        job_stage("upload")
+        popularity_json = EncodedJsonObject(team_popularity_map)
+        try:
+            upload_json_to_gcs("seatgeek_api_data.json", popularity_json)
+        except Exception as e:
+            print("GCS upload failed:", str(e))
+            raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+        return popularity_json
+
+    popularity_json = run_exclusive("seatgeek", fetch_and_upload)
     if crontab:
         return None
-    return json_response
+    return popularity_json
 
 @app.get("/retrieve_all_nba_game_data_as_csv")
-def get_nba_game_data_csv(crontab: bool = False):
+@coalesced("nba_game_data_csv")
+def get_nba_game_data_csv(crontab: bool = False, stream: bool = False):
     """
-    Fetches all NBA game data and uploads CSVs to GCS directly.
+    Refreshes the game log partitions that can still change (the
+    current season's) and uploads the home and away CSVs rebuilt from
+    all partitions to GCS. Seasons come from the partition catalog.
+    With stream, the CSVs are written partition by partition instead
+    of being combined in memory first.
     """
     try:
-        years = ["2013-14", "2014-15", "2015-16", "2016-17", "2017-18",
-                 "2018-19", "2019-20", "2020-21", "2021-22", "2022-23",
-                 "2023-24"]
-        home_df, away_df, _, _ = get_useful_stats(years, name_to_id, save=False)
-
+        partitions, years, team_ids = refresh_nba_game_data()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Something went wrong: {e}")
 
-    try:
-        gcs_info_home = {
-            "service_account_key": service_account_file_path,
-            "project_id": project_id,
-            "bucket_name": bucket_name,
-            "file_name": "all_nba_game_data_home.csv",
-            "data": home_df.to_csv(index=False)
+    if stream:
+        job_stage("stream upload")
+        try:
+            home_rows, away_rows = stream_nba_game_data_to_gcs(partitions, years,
+                                                               team_ids)
+        except Exception as e:
+            print("Streaming upload failed:", str(e))
+            raise HTTPException(status_code=500,
+                                detail=f"Something went wrong: {e}")
+        if crontab:
+            return None
+        return {
+            "home_csv": "all_nba_game_data_home.csv",
+            "away_csv": "all_nba_game_data_away.csv",
+            "message": f"Streamed {home_rows} home games and {away_rows} away games to GCS"
         }
-        save_to_gcs(GcsStringUpload(**gcs_info_home))
-
-        gcs_info_away = {
-            "service_account_key": service_account_file_path,
-            "project_id": project_id,
-            "bucket_name": bucket_name,
-            "file_name": "all_nba_game_data_away.csv",
-            "data": away_df.to_csv(index=False)
-        }
-        save_to_gcs(GcsStringUpload(**gcs_info_away))
+    job_stage("build tables")
+    home_df, away_df = build_game_log_tables(
+        iter_partitioned_game_logs(partitions, years, team_ids))
+
+    job_stage("upload")
+    try:
+        run_uploads([
+            lambda: upload_csv_to_gcs("all_nba_game_data_home.csv", home_df),
+            lambda: upload_csv_to_gcs("all_nba_game_data_away.csv", away_df)])
     except Exception as e:
         print("GCS upload failed:", str(e))
         raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
@@ -132,46 +301,320 @@ def get_nba_game_data_csv(crontab: bool = False):
     }
 
     
-@app.get("/retrieve_nba_game_ids_as_json_file")
-def get_game_ids(crontab = False):
-    '''
-    Gets NBA game ids and returns a json. Saves
-    json into GCS bucket as well.
-    '''
+@app.get("/retrieve_all_nba_game_data_as_parquet")
+@coalesced("nba_game_data_parquet")
+def get_nba_game_data_parquet(crontab: bool = False):
+    """
+    Refreshes the game log partitions like the csv endpoint and
+    uploads the home and away tables as one parquet file per season,
+    keeping their compact dtypes, plus nba_game_data/_manifest.json
+    listing the files.
+    """
     try:
-        team_dict = create_team_dictionary_from_web()
-        combined_games_id_dict = get_game_id_from_json(json.dumps(team_dict), name_to_id)
+        partitions, years, team_ids = refresh_nba_game_data()
+        job_stage("build tables")
+        home_df, away_df = build_game_log_tables(
+            iter_partitioned_game_logs(partitions, years, team_ids))
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500,
-                            detail=f"Something went wrong: {str(e)}")
-    json_response = JSONResponse(
-            content=combined_games_id_dict,
-            media_type="application/json",
-            headers={"Content-Disposition": "attachment; filename=get_game_ids.json"})
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {e}")
+
+    job_stage("upload")
     try:
-        gcs_info = {"service_account_key": service_account_file_path,
-                    "project_id": project_id,
-                    "bucket_name": bucket_name,
-                    "file_name": "get_game_ids.json",
-                    "data": json.dumps(combined_games_id_dict)}
-        save_to_gcs(GcsStringUpload(**gcs_info))
+        parquet_manifest = upload_nba_game_data_parquet(home_df, away_df)
     except Exception as e:
         print("GCS upload failed:", str(e))
         raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+
     if crontab:
         return None
-    return json_response
 
-    
-def create_team_dictionary_from_web():
+    return parquet_manifest
+
+
+@app.get("/retrieve_game_facts_as_parquet")
+@coalesced("game_facts")
+def get_game_facts_parquet(crontab: bool = False):
+    """
+    Publishes game_facts.parquet, one row per game and team: the
+    refreshed game logs joined once with the attendance and game ids
+    of the published get_game_ids.json, so consumers don't have to
+    join the datasets themselves. Needs the game id endpoint to have
+    run first.
+    """
+    job_stage("load game ids")
+    try:
+        games_with_ids = load_published_json("get_game_ids.json")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"GCS download failed: {e}")
+    if games_with_ids is None:
+        raise HTTPException(status_code=409,
+                            detail="get_game_ids.json hasn't been published yet")
+    try:
+        partitions, years, team_ids = refresh_nba_game_data()
+        job_stage("build facts")
+        home_df, away_df = build_game_log_tables(
+            iter_partitioned_game_logs(partitions, years, team_ids))
+        facts = build_game_facts(home_df, away_df, games_with_ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Something went wrong: {e}")
+
+    job_stage("upload")
+    try:
+        buffer = io.BytesIO()
+        facts.to_parquet(buffer, compression="zstd")
+        store.write_bytes("game_facts.parquet", buffer.getvalue(),
+                          "application/vnd.apache.parquet")
+        published_artifacts.invalidate("game_facts.parquet")
+    except Exception as e:
+        print("GCS upload failed:", str(e))
+        raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+
+    if crontab:
+        return None
+
+    return {
+        "file": "game_facts.parquet",
+        "rows": len(facts),
+        "games": int(facts.index.get_level_values("GAME_ID").nunique()),
+        "rows_with_attendance": int(facts["ATTENDANCE"].notna().sum())
+    }
+
+
+@app.get("/retrieve_nba_game_ids_as_json_file")
+@serves_published("get_game_ids.json", ("team", "games"))
+@coalesced("nba_game_ids")
+def get_game_ids(crontab: bool = False, max_age_hours: float = None):
+    '''
+    Returns the published NBA game ids json. With refresh
+    (or crontab), first looks them up and saves the json
+    into GCS bucket. Game ids come from the
+    persistent game id index; only dates missing from it
+    are looked up with nba-api. The attendance data is taken
+    from the published nba_attendance_data.json when it is at
+    most max_age_hours old, and only scraped (and published,
+    see refresh_nba_attendance) otherwise.
+    '''
+    if max_age_hours is None:
+        max_age_hours = artifact_max_age_hours
+
+    def look_up_and_upload():
+        job_stage("load attendance")
+        try:
+            team_dict = load_fresh_published_json("nba_attendance_data.json",
+                                                  max_age_hours * 3600)
+        except Exception as e:
+            raise HTTPException(status_code=500,
+                                detail=f"Something went wrong: {str(e)}")
+        if team_dict is None:
+            job_stage("scrape attendance")
+            team_dict, _ = refresh_nba_attendance()
+        job_stage("look up game ids")
+        try:
+            index = load_game_id_index()
+            combined_games_id_dict = get_game_id_from_json(dumps_json(team_dict), name_to_id,
+                                                           index=index)
+        except Exception as e:
+            raise HTTPException(status_code=500,
+                                detail=f"Something went wrong: {str(e)}")
+        job_stage("upload")
+        game_ids_json = EncodedJsonObject(combined_games_id_dict)
+        try:
+            run_uploads([
+                lambda: upload_json_to_gcs("get_game_ids.json", game_ids_json),
+                lambda: save_game_id_index(index)])
+        except Exception as e:
+            print("GCS upload failed:", str(e))
+            raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+        return game_ids_json
+
+    game_ids_json = run_exclusive("nba_game_ids", look_up_and_upload)
+    if crontab:
+        return None
+    return game_ids_json
+
+
+
+@app.post("/retrieve_nba_attendance_data_as_json_file", status_code=202)
+def start_nba_attendance_job(incremental: bool = False, stream: bool = False):
+    '''
+    Starts the attendance scrape of the GET endpoint as a background
+    job and returns its id right away; see /jobs/{job_id}.
+    '''
+    return submit_job("nba_attendance", get_nba_attendance_data_as_json,
+                      crontab=True, incremental=incremental, stream=stream)
+
+
+@app.post("/retrieve_seatgeek_api_data_as_json_file", status_code=202)
+def start_seatgeek_job():
+    return submit_job("seatgeek", get_seatgeek_api_data, crontab=True)
+
+
+@app.post("/retrieve_all_nba_game_data_as_csv", status_code=202)
+def start_nba_game_data_csv_job(stream: bool = False):
+    return submit_job("nba_game_data_csv", get_nba_game_data_csv, stream=stream)
+
+
+@app.post("/retrieve_all_nba_game_data_as_parquet", status_code=202)
+def start_nba_game_data_parquet_job():
+    return submit_job("nba_game_data_parquet", get_nba_game_data_parquet)
+
+
+@app.post("/retrieve_game_facts_as_parquet", status_code=202)
+def start_game_facts_job():
+    return submit_job("game_facts", get_game_facts_parquet)
+
+
+@app.post("/retrieve_nba_game_ids_as_json_file", status_code=202)
+def start_game_ids_job(max_age_hours: float = None):
+    return submit_job("nba_game_ids", get_game_ids,
+                      crontab=True, max_age_hours=max_age_hours)
+
+
+@app.get("/games")
+def query_games(team: str = None, season: str = None,
+                date_from: datetime.date = None, date_to: datetime.date = None,
+                min_attendance: int = Query(None, ge=0), home: bool = None,
+                limit: int = Query(None, ge=0)):
+    """
+    Games of the published game facts (one row per game and team)
+    matching every given filter: team (id, abbreviation or name),
+    season (e.g. 2024-25), the date range (inclusive), the minimum
+    attendance and home. Returns how many matched and the first
+    limit of them.
+    """
+    games = load_game_query_store()
+    team_id = None
+    if team is not None:
+        team_id = games.team_id(team)
+        if team_id is None:
+            raise HTTPException(status_code=404, detail=f"Unknown team {team}")
+    rows = games.select(team_id=team_id, season=season, date_from=date_from,
+                        date_to=date_to, min_attendance=min_attendance, home=home)
+    return Response(content=dumps_json({"count": len(rows),
+                                        "games": games.games(rows[:limit])}),
+                    media_type="application/json")
+
+
+@app.get("/aggregates/home_win_rate")
+def get_home_win_rate(group_by: str = "team,season"):
+    """
+    Home games, home wins and home win rate per team, season or
+    team and season (group_by), or overall with an empty group_by.
+    """
+    group_by = tuple(dict.fromkeys(group.strip() for group in group_by.split(",")
+                                   if group.strip()))
+    unknown = [group for group in group_by if group not in WIN_RATE_GROUPS]
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Can't group by {', '.join(unknown)}; "
+                                   f"use {', '.join(WIN_RATE_GROUPS)}")
+    return Response(content=dumps_json(load_game_query_store().home_win_rate(group_by)),
+                    media_type="application/json")
+
+
+@app.get("/jobs")
+def list_jobs():
+    """
+    The most recent background jobs, newest first.
+    """
+    return [job.to_dict() for job in job_runner.recent()]
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """
+    State of a background job: the stage it is in, how long each
+    stage took, and its result (the GET endpoint's summary, where
+    it has one) or error.
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return job.to_dict()
+
+
+def submit_job(kind: str, fn, **params) -> dict:
+    '''
+    Queues fn(**params) on the job runner. Answers 429 when too many
+    jobs are already waiting.
+    '''
+    try:
+        job = job_runner.submit(kind, fn, **params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}")
+    return {"job_id": job.id, "kind": kind, "status_url": f"/jobs/{job.id}"}
+
+
+def bref_scrape_options() -> dict:
+    '''
+    Keyword arguments for scrape_nba_attendance_data taken from
+    the environment configuration.
+    '''
+    return {"use_async": bref_async_scrape,
+            "requests_per_minute": bref_requests_per_minute,
+            "burst": bref_burst,
+            "max_in_flight": bref_max_in_flight,
+            "cache": ResponseCache(http_cache_dir,
+                                   max_bytes=http_cache_max_mb * 1024 * 1024,
+                                   offline=offline_mode)}
+
+
+def game_log_fetch_options() -> dict:
+    '''
+    Keyword arguments for iter_team_game_logs taken from the
+    environment configuration.
+    '''
+    return {"workers": nba_api_workers,
+            "retries": nba_api_retries,
+            "controller": AdaptiveRateController(
+                interval=nba_api_interval, min_interval=nba_api_min_interval)}
+
+
+def job_manifest(job_name: str) -> JobManifest:
+    '''
+    Opens the checkpoint of a scrape job, so a retry after a
+    timeout resumes where the failed run stopped.
+    '''
+    return JobManifest(checkpoint_dir, job_name,
+                       max_age_seconds=checkpoint_max_age_hours * 3600)
+
+
+def create_team_dictionary_from_web(incremental: bool = False,
+                                    manifest: JobManifest = None):
     '''
     Creates a dictionary mapping teams to their attendance data
-    from basketball-reference.
+    from basketball-reference. With incremental, only the months
+    of the current season played so far are scraped and merged
+    into the published nba_attendance_data.json; without a
+    published file it falls back to a full scrape. Scraped months
+    are checkpointed in the manifest, if one is given.
     '''
     try:
-        df_scraped = scrape_nba_attendance_data()
-        df_cleaned = clean_nba_attendance_data(df_scraped)
-        team_dict = create_nba_team_dictionary(df_cleaned)
+        existing = None
+        if incremental:
+            existing = load_published_json("nba_attendance_data.json")
+            if existing is None:
+                print("No published attendance data, doing a full scrape")
+        if existing is None:
+            df_scraped = scrape_nba_attendance_data(manifest=manifest,
+                                                    **bref_scrape_options())
+            df_cleaned = clean_nba_attendance_data(df_scraped)
+            team_dict = create_nba_team_dictionary(df_cleaned)
+        else:
+            season = latest_season()
+            df_scraped = scrape_nba_attendance_data(
+                years=[season], months=months_played(season),
+                manifest=manifest, **bref_scrape_options())
+            new_team_dict = {}
+            if not df_scraped.empty:
+                df_cleaned = clean_nba_attendance_data(df_scraped)
+                new_team_dict = create_nba_team_dictionary(df_cleaned)
+            team_dict = merge_team_dictionaries(existing, new_team_dict,
+                                                schedule_months(df_scraped))
     except Exception as e:
         print("Scrape Failed! Error: " + str(e))
         raise HTTPException(status_code=500, detail=
@@ -179,21 +622,258 @@ def create_team_dictionary_from_web():
     return team_dict
 
 
-def save_to_gcs(gcs_upload_param: GcsStringUpload):
+def upload_json_to_gcs(file_name: str, data: EncodedJsonObject):
     """
-    Access the bucket with service_account_key, and upload the object(blob)
-    the the storage. Code adapted from MSDS691 class.
+    Writes a dict encoded once (see EncodedJsonObject) straight into a
+    bucket object, one top-level member at a time, instead of building
+    the json document first.
     """
-    credentials = service_account.Credentials.\
-        from_service_account_file(gcs_upload_param.service_account_key)
-    client = storage.Client(project=gcs_upload_param.project_id,
-                            credentials=credentials)
-    bucket = client.bucket(gcs_upload_param.bucket_name)
-    file = bucket.blob(gcs_upload_param.file_name)
-    blob_data = gcs_upload_param.data
-    file.upload_from_string(blob_data,
-                            content_type="application/json")
-    return {
-        "message": f"file {gcs_upload_param.file_name} has been uploaded "
-                   f"to {gcs_upload_param.bucket_name} successfully."
-        }
+    with store.open_text_writer(file_name, "application/json") as out:
+        data.write_to(out)
+
+
+def upload_csv_to_gcs(file_name: str, df: pd.DataFrame):
+    """
+    Writes a DataFrame as csv straight into a bucket object; pandas
+    formats it in row chunks instead of as one string.
+    """
+    with store.open_text_writer(file_name, "text/csv") as out:
+        df.to_csv(out, index=False)
+
+
+def run_uploads(uploads: list) -> list:
+    """
+    Runs independent uploads (callables) concurrently on up to
+    GCS_UPLOAD_WORKERS threads sharing the storage client. Returns
+    their results in order; if any failed, the first error is raised
+    once all of them have finished.
+    """
+    if not uploads:
+        return []
+    with ThreadPoolExecutor(max_workers=gcs_upload_workers) as executor:
+        futures = [executor.submit(upload) for upload in uploads]
+    errors = [future.exception() for future in futures
+              if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    return [future.result() for future in futures]
+
+
+def refresh_nba_attendance(incremental: bool = False) -> tuple:
+    """
+    Scrapes the attendance data (only the current season with
+    incremental) and publishes nba_attendance_data.json. Runs as the
+    basketball-reference scrape (see run_exclusive), which the
+    streamed refresh and the game id endpoint's fallback are runs of
+    too, so only one of them scrapes at a time and the checkpoint is
+    only cleared by the run it belongs to. Returns the team dict and
+    its json encoding.
+    """
+    def refresh():
+        manifest = job_manifest("nba_attendance_incremental" if incremental
+                                else "nba_attendance")
+        job_stage("scrape")
+        team_dict = create_team_dictionary_from_web(incremental=incremental,
+                                                    manifest=manifest)
+        job_stage("upload")
+        team_json = EncodedJsonObject(team_dict)
+        try:
+            upload_json_to_gcs("nba_attendance_data.json", team_json)
+            with artifact_cache.open("nba_attendance_data.json") as out:
+                team_json.write_to(out)
+        except Exception as e:
+            print("GCS upload failed:", e)
+            raise HTTPException(status_code=500, detail=f"GCS upload failed: {e}")
+        manifest.clear()
+        return team_dict, team_json
+
+    return run_exclusive("bref_scrape", refresh,
+                         variant="incremental" if incremental else "full")
+
+
+def stream_nba_attendance_data_to_gcs() -> int:
+    """
+    Scrapes the attendance data month by month and streams the team
+    json into nba_attendance_data.json, as a run of the
+    basketball-reference scrape (see refresh_nba_attendance). Returns
+    the number of teams.
+    """
+    def stream():
+        manifest = job_manifest("nba_attendance_stream")
+        team_dicts = iter_team_dictionaries(manifest=manifest,
+                                            **bref_scrape_options())
+        with store.open_text_writer("nba_attendance_data.json",
+                                    "application/json") as out:
+            teams = stream_team_json(team_dicts, out)
+        manifest.clear()
+        return teams
+
+    return run_exclusive("bref_scrape", stream, variant="stream")
+
+
+def refresh_nba_game_data() -> tuple:
+    """
+    Refreshes the game log partitions that can still change and
+    mirrors them to the bucket. Returns the partitions with the
+    seasons and team ids they cover. The csv, parquet and game facts
+    endpoints all need it, so it runs as one piece of work (see
+    run_exclusive): never twice at once across instances, and shared
+    by the endpoints of this instance refreshing at the same time.
+    """
+    return run_exclusive("game_log_refresh", _refresh_nba_game_data)
+
+
+def _refresh_nba_game_data() -> tuple:
+    manifest = job_manifest("nba_game_data")
+    job_stage("load game log partitions")
+    partitions = load_game_log_partitions()
+    years = partitions.seasons_to_date(game_log_first_season)
+    team_ids = list(dict.fromkeys(name_to_id.values()))
+    job_stage("refresh game logs")
+    try:
+        refresh_game_log_partitions(partitions, years, team_ids, manifest,
+                                    **game_log_fetch_options())
+    finally:
+        job_stage("publish game log partitions")
+        publish_game_log_partitions(partitions)
+    manifest.clear()
+    return partitions, years, team_ids
+
+
+def upload_nba_game_data_parquet(home_df: pd.DataFrame,
+                                 away_df: pd.DataFrame) -> dict:
+    """
+    Uploads the home and away tables as one parquet file per season
+    under nba_game_data/, then the manifest listing them, which is
+    what readers open first. Returns the manifest.
+    """
+    parquet_manifest = {"format": "parquet", "seasons": {}}
+    uploads = []
+    for season, home_part, away_part in iter_game_data_seasons(home_df, away_df):
+        entry = {}
+        for venue, part in (("home", home_part), ("away", away_part)):
+            file_name = f"nba_game_data/{venue}/season={season}.parquet"
+            buffer = io.BytesIO()
+            part.to_parquet(buffer, index=False, compression="zstd")
+            uploads.append(functools.partial(
+                store.write_bytes, file_name, buffer.getvalue(),
+                "application/vnd.apache.parquet"))
+            entry[venue] = {"file": file_name, "rows": len(part)}
+        parquet_manifest["seasons"][season] = entry
+    written = run_uploads(uploads)
+    print(f"Uploaded {sum(written)} of {len(written)} season files, "
+          f"the others were unchanged")
+    store.write_bytes("nba_game_data/_manifest.json",
+                      json.dumps(parquet_manifest, indent=2).encode("utf-8"),
+                      "application/json")
+    return parquet_manifest
+
+
+def stream_nba_game_data_to_gcs(partitions: GameLogPartitions, years: list,
+                                team_ids: list) -> tuple:
+    """
+    Appends the game log partitions one by one to the home and away
+    csv objects. Returns the number of home and away rows written.
+    """
+    with store.open_text_writer("all_nba_game_data_home.csv", "text/csv") as home_out, \
+            store.open_text_writer("all_nba_game_data_away.csv", "text/csv") as away_out:
+        home_writer = CsvStreamWriter(home_out)
+        away_writer = CsvStreamWriter(away_out)
+        for df in iter_partitioned_game_logs(partitions, years, team_ids):
+            home_df, away_df = split_team_game_logs(df)
+            home_writer.write(home_df)
+            away_writer.write(away_df)
+    return home_writer.rows, away_writer.rows
+
+
+def load_game_log_partitions() -> GameLogPartitions:
+    """
+    Opens the local game log partitions, first copying over any
+    partition the bucket has a newer fetch of (e.g. on a fresh Cloud
+    Run instance).
+    """
+    partitions = GameLogPartitions(game_log_partition_dir)
+    remote_catalog = store.read_bytes("game_logs/" + GameLogPartitions.catalog_name)
+    if remote_catalog is not None:
+        for season, team_id, entry in partitions.missing_from(remote_catalog):
+            data = store.read_bytes("game_logs/" + entry["file"])
+            if data is not None:
+                partitions.adopt(season, team_id, entry, data)
+    return partitions
+
+
+def publish_game_log_partitions(partitions: GameLogPartitions):
+    """
+    Mirrors the partitions the bucket doesn't have yet (in practice
+    the freshly refreshed ones) and then the catalog to game_logs/.
+    """
+    remote_catalog = store.read_bytes("game_logs/" + GameLogPartitions.catalog_name)
+    written = run_uploads([
+        functools.partial(store.upload_file, partitions.path(entry["file"]),
+                          "game_logs/" + entry["file"], "application/vnd.apache.parquet")
+        for season, team_id, entry in partitions.newer_than(remote_catalog or "{}")])
+    if written:
+        print(f"Mirrored {sum(written)} of {len(written)} refreshed partitions, "
+              f"the others were unchanged")
+    store.write_bytes("game_logs/" + GameLogPartitions.catalog_name,
+                      partitions.catalog_json().encode("utf-8"),
+                      "application/json")
+
+
+def load_game_id_index() -> GameIdIndex:
+    """
+    Loads the game id index from local disk, falling back to the
+    copy mirrored in the bucket (e.g. on a fresh Cloud Run instance).
+    """
+    index = GameIdIndex.load(game_id_index_path)
+    if not index.fetched_seasons:
+        content = store.read_text("game_id_index.json")
+        if content is not None:
+            index = GameIdIndex.from_json(content, game_id_index_path)
+    return index
+
+
+def save_game_id_index(index: GameIdIndex):
+    """
+    Saves the game id index locally and mirrors it to the bucket.
+    """
+    index.save()
+    store.write_text("game_id_index.json", index.to_json(), "application/json")
+
+
+def load_fresh_published_json(file_name: str, max_age_seconds: float):
+    """
+    Loads an artifact published by another endpoint if it is at most
+    max_age_seconds old, looking in the local artifact cache first and
+    then in the bucket. Returns None if there is no fresh copy.
+    """
+    content = artifact_cache.get(file_name, max_age_seconds)
+    if content is None:
+        data, updated = store.read_fresh(file_name, max_age_seconds)
+        if data is None:
+            return None
+        content = data.decode("utf-8")
+        artifact_cache.put(file_name, content, published_at=updated)
+    print(f"Reusing published {file_name}")
+    return loads_json(content)
+
+
+def load_game_query_store() -> GameQueryStore:
+    """
+    The in-memory query store over the published game facts;
+    answers 503 until they have been published.
+    """
+    games = game_queries.get()
+    if games is None:
+        raise HTTPException(status_code=503,
+                            detail="game_facts.parquet hasn't been published yet")
+    return games
+
+
+def load_published_json(file_name: str):
+    """
+    Loads a json file previously published to the bucket, or
+    None if it hasn't been published yet.
+    """
+    content = store.read_bytes(file_name)
+    return None if content is None else loads_json(content)
@@ -0,0 +1,123 @@
+import datetime
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LocalArtifactCache:
+    '''
+    Local copies of the artifacts the pipeline publishes, so an
+    endpoint that needs another endpoint's output (e.g. the game ids
+    needing the attendance json) can reuse it instead of scraping
+    again. The file's modification time is its publish time.
+    '''
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def put(self, name: str, data,
+            published_at: datetime.datetime = None) -> None:
+        '''
+        Stores an artifact (text, or bytes of UTF-8 text), published
+        now unless published_at says otherwise (e.g. for a copy
+        downloaded from the bucket).
+        '''
+        path = os.path.join(self.cache_dir, name)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        if published_at is not None:
+            timestamp = published_at.timestamp()
+            os.utime(path + ".tmp", (timestamp, timestamp))
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def open(self, name: str):
+        '''
+        Opens a text stream that becomes the artifact, published now,
+        once the block completes; if it raises, the previous copy is
+        kept.
+        '''
+        path = os.path.join(self.cache_dir, name)
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                yield f
+        except BaseException:
+            os.remove(path + ".tmp")
+            raise
+        os.replace(path + ".tmp", path)
+
+    def get(self, name: str, max_age_seconds: float):
+        '''
+        Returns the artifact's content if it was published less than
+        max_age_seconds ago, otherwise None.
+        '''
+        path = os.path.join(self.cache_dir, name)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age_seconds:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+class PublishedArtifactCache:
+    '''
+    The published artifacts as the GET endpoints serve them: the
+    content of the bucket object in memory, with a strong ETag (a hash
+    of the content). An artifact is served from memory for ttl_seconds,
+    then its object's version is looked up again and the content only
+    downloaded if it changed, so a refresh published by any instance
+    is served at most ttl_seconds later.
+    '''
+
+    def __init__(self, store, ttl_seconds: float):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        '''
+        Returns the artifact's (content, etag), or None if it was never
+        published.
+        '''
+        with self._lock:
+            cached = self._artifacts.get(name)
+        if cached is not None and time.time() - cached[2] < self.ttl_seconds:
+            return cached[:2]
+        body = self.store.read_bytes_cached(name)
+        if body is None:
+            self.invalidate(name)
+            return None
+        if cached is not None and body is cached[0]:
+            etag = cached[1]
+        else:
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        with self._lock:
+            self._artifacts[name] = (body, etag, time.time())
+        return body, etag
+
+    def invalidate(self, name: str) -> None:
+        '''
+        Makes the next get() look at the bucket again, e.g. after this
+        instance published the artifact.
+        '''
+        with self._lock:
+            self._artifacts.pop(name, None)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    '''
+    Whether an If-None-Match header value names etag (weak
+    comparison, as for GET requests).
+    '''
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
@@ -0,0 +1,77 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class JobManifest:
+    '''
+    Checkpoint of a long-running scrape job. Each completed unit of
+    work (a season/month page, a team/season game log, ...) is
+    recorded in manifest.json with its partial result pickled next
+    to it, so a retried run can load finished units from disk and
+    only fetch the rest.
+
+    A manifest older than max_age_seconds is discarded when opened,
+    so results from an abandoned run are never reused the next night.
+    Callers clear() the manifest once the job's output is published.
+    '''
+
+    def __init__(self, checkpoint_dir: str, job_name: str,
+                 max_age_seconds: float = 12 * 3600):
+        self.job_dir = os.path.join(checkpoint_dir, job_name)
+        self.manifest_path = os.path.join(self.job_dir, "manifest.json")
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.manifest = self._read()
+        age = time.time() - self.manifest.get("started_at", time.time())
+        if age > max_age_seconds:
+            logger.info(f"Discarding {age / 3600:.1f}h old checkpoint "
+                        f"for {job_name}")
+            self.clear()
+        elif self.manifest["units"]:
+            logger.info(f"Resuming {job_name}: "
+                        f"{len(self.manifest['units'])} units already done")
+
+    def _read(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"started_at": time.time(), "units": {}}
+
+    def _write(self) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_done(self, unit: str) -> bool:
+        return unit in self.manifest["units"]
+
+    def save(self, unit: str, result) -> None:
+        '''
+        Persists a unit's result and marks the unit completed.
+        '''
+        file_name = re.sub(r"[^A-Za-z0-9_.-]", "_", unit) + ".pkl"
+        path = os.path.join(self.job_dir, file_name)
+        pd.to_pickle(result, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.manifest["units"][unit] = {"file": file_name,
+                                        "completed_at": time.time()}
+        self._write()
+
+    def load(self, unit: str):
+        file_name = self.manifest["units"][unit]["file"]
+        return pd.read_pickle(os.path.join(self.job_dir, file_name))
+
+    def clear(self) -> None:
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.manifest = {"started_at": time.time(), "units": {}}
+        self._write()
@@ -9,4 +9,58 @@ bucket_name = os.getenv('GCP_BUCKET_NAME')
 service_account_file_path = os.getenv('GCP_SERVICE_ACCOUNT_KEY')
 api_server_url = os.getenv('API_SERVICE_URL')
 client_id = os.getenv("SEATGEEK_CLIENT_ID")
-secret_id = os.getenv("SECRET_ID")
\ No newline at end of file
+secret_id = os.getenv("SECRET_ID")
+# Where artifacts are published: gcs (the bucket) or local (a directory
+# standing in for it, to run and benchmark the pipeline offline)
+storage_backend = os.getenv('STORAGE_BACKEND', 'gcs').lower()
+local_storage_dir = os.getenv('LOCAL_STORAGE_DIR', '.cache/bucket')
+# Content-Encoding of published json/csv objects: gzip or none
+gcs_compression = os.getenv('GCS_COMPRESSION', 'gzip').lower()
+# Concurrent uploads, and the resumable upload chunk (a multiple of 256 KB)
+gcs_upload_workers = int(os.getenv('GCS_UPLOAD_WORKERS', '4'))
+gcs_upload_chunk_bytes = max(1, round(float(os.getenv('GCS_UPLOAD_CHUNK_MB', '8')) * 4)) * 256 * 1024
+
+# basketball-reference scraping budget
+bref_async_scrape = os.getenv('BREF_ASYNC_SCRAPE', 'true').lower() == 'true'
+bref_requests_per_minute = float(os.getenv('BREF_REQUESTS_PER_MINUTE', '18'))
+bref_burst = int(os.getenv('BREF_BURST', '3'))
+bref_max_in_flight = int(os.getenv('BREF_MAX_IN_FLIGHT', '3'))
+
+# stats.nba.com game log fetching (worker threads, adaptive pacing, retries)
+nba_api_workers = int(os.getenv('NBA_API_WORKERS', '4'))
+nba_api_interval = float(os.getenv('NBA_API_INTERVAL', '1.0'))
+nba_api_min_interval = float(os.getenv('NBA_API_MIN_INTERVAL', '0.25'))
+nba_api_retries = int(os.getenv('NBA_API_RETRIES', '3'))
+
+# Per-(team, season) game log partitions, mirrored to the bucket under game_logs/
+game_log_partition_dir = os.getenv('GAME_LOG_PARTITION_DIR', '.cache/game_logs')
+game_log_first_season = os.getenv('GAME_LOG_FIRST_SEASON', '2013-14')
+
+# On-disk cache of basketball-reference pages
+http_cache_dir = os.getenv('HTTP_CACHE_DIR', '.cache/http')
+http_cache_max_mb = int(os.getenv('HTTP_CACHE_MAX_MB', '256'))
+offline_mode = os.getenv('OFFLINE_MODE', 'false').lower() == 'true'
+
+# Checkpoints of partially completed scrape jobs
+checkpoint_dir = os.getenv('CHECKPOINT_DIR', '.cache/checkpoints')
+checkpoint_max_age_hours = float(os.getenv('CHECKPOINT_MAX_AGE_HOURS', '12'))
+
+# Local copy of the (team, date) -> GAME_ID index, mirrored to the bucket
+game_id_index_path = os.getenv('GAME_ID_INDEX_PATH', '.cache/game_id_index.json')
+
+# Reuse of artifacts published by other endpoints
+artifact_cache_dir = os.getenv('ARTIFACT_CACHE_DIR', '.cache/artifacts')
+artifact_max_age_hours = float(os.getenv('ARTIFACT_MAX_AGE_HOURS', '6'))
+# How long the GET endpoints serve a published json from memory before
+# checking the bucket for a newer version
+artifact_serve_ttl_seconds = float(os.getenv('ARTIFACT_SERVE_TTL_SECONDS', '60'))
+
+# Background jobs started with POST: worker threads, how many may wait
+# for a worker, and how many finished jobs are kept for /jobs
+job_workers = int(os.getenv('JOB_WORKERS', '2'))
+job_queue_limit = int(os.getenv('JOB_QUEUE_LIMIT', '8'))
+job_history = int(os.getenv('JOB_HISTORY', '100'))
+
+# Storage leases keeping instances from running the same refresh at
+# once; renewed every third of the TTL while the refresh runs
+lease_ttl_seconds = float(os.getenv('LEASE_TTL_SECONDS', '300'))
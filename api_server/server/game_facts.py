@@ -0,0 +1,39 @@
+import pandas as pd
+
+# Primary key of the fact table, in sort order: (team, season) slices
+# are contiguous and every row is one team's side of one game
+GAME_FACT_INDEX = ['TEAM_ID', 'SEASON_YEAR', 'GAME_ID']
+
+
+def attendance_by_game_id(games_with_ids: dict) -> pd.DataFrame:
+    '''
+    Attendance per GAME_ID from the get_game_ids json
+    ({home team: [{"Date", "Attendance", ..., "GameID"}, ...]}).
+    Games without a GameID are left out.
+    '''
+    rows = [(game["GameID"], game.get("Attendance"))
+            for games in games_with_ids.values() for game in games
+            if game.get("GameID")]
+    attendance = pd.DataFrame(rows, columns=['GAME_ID', 'ATTENDANCE'])
+    attendance['ATTENDANCE'] = attendance['ATTENDANCE'].astype("Int32")
+    return attendance.drop_duplicates('GAME_ID')
+
+
+def build_game_facts(home_df: pd.DataFrame, away_df: pd.DataFrame,
+                     games_with_ids: dict) -> pd.DataFrame:
+    '''
+    Joins the home and away game log tables with the attendance of
+    every game into one long table with one row per game and team,
+    indexed and sorted by GAME_FACT_INDEX. It keeps the HOME flag,
+    OPP, the box-score and derived stats, the win rates (HOME_WINRATE
+    on home rows, AWAY_WINRATE on away rows) and ATTENDANCE, which is
+    shared by both teams of a game. The per-stat league ranks
+    (*_RANK) are dropped.
+    '''
+    facts = pd.concat([home_df, away_df], ignore_index=True)
+    facts = facts.drop(columns=[column for column in facts.columns
+                                if column.endswith('_RANK')])
+    facts = facts.drop_duplicates(['GAME_ID', 'TEAM_ID'])
+    facts = facts.merge(attendance_by_game_id(games_with_ids),
+                        on='GAME_ID', how='left')
+    return facts.set_index(GAME_FACT_INDEX, verify_integrity=True).sort_index()
@@ -0,0 +1,119 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def season_end_date(season: str) -> datetime.date:
+    '''
+    Date after which a season ("2013-14") can't gain new games.
+    '''
+    return datetime.date(int(season[:4]) + 1, 7, 1)
+
+
+class GameIdIndex:
+    '''
+    Persistent index from (team_id, game_date) to GAME_ID, built up
+    from LeagueGameFinder results one season at a time. It remembers
+    when each season was fetched: a season fetched after it ended is
+    final and never fetched again, so only dates of the current
+    season that aren't indexed yet cost new requests.
+
+    Lookups are O(1) dict hits; join() resolves whole columns at once.
+    The index is stored as json at path and can be mirrored elsewhere
+    (e.g. the bucket) through to_json()/from_json().
+    '''
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.game_ids = {}
+        self.fetched_seasons = {}
+        self._series = None
+
+    @classmethod
+    def from_json(cls, content: str, path: str = None) -> "GameIdIndex":
+        data = json.loads(content)
+        index = cls(path)
+        index.fetched_seasons = data["fetched_seasons"]
+        index.game_ids = {(int(team_id), game_date): game_id
+                          for team_id, games in data["games"].items()
+                          for game_date, game_id in games.items()}
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "GameIdIndex":
+        '''
+        Loads the index saved at path, or an empty one if there is
+        none yet.
+        '''
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_json(f.read(), path)
+        except (OSError, ValueError):
+            return cls(path)
+
+    def to_json(self) -> str:
+        games = {}
+        for (team_id, game_date), game_id in sorted(self.game_ids.items()):
+            games.setdefault(str(team_id), {})[game_date] = game_id
+        return json.dumps({"fetched_seasons": self.fetched_seasons,
+                           "games": games})
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self.game_ids)
+
+    def get(self, team_id: int, game_date: str):
+        return self.game_ids.get((team_id, game_date))
+
+    def is_final(self, season: str) -> bool:
+        fetched_at = self.fetched_seasons.get(season)
+        return (fetched_at is not None and
+                datetime.date.fromisoformat(fetched_at) >= season_end_date(season))
+
+    def seasons_to_fetch(self, keys, season_for_date) -> list:
+        '''
+        Seasons that have to be fetched to resolve the (team_id,
+        game_date) keys: those with a date missing from the index,
+        except seasons that are already final.
+        '''
+        seasons = {season_for_date(game_date) for team_id, game_date in keys
+                   if (team_id, game_date) not in self.game_ids}
+        return sorted(season for season in seasons if not self.is_final(season))
+
+    def update(self, season: str, lookups: dict,
+               fetched_at: datetime.date = None) -> None:
+        '''
+        Adds one season of {team_id: {game_date: game_id}}.
+        '''
+        for team_id, games in lookups.items():
+            for game_date, game_id in games.items():
+                self.game_ids[(int(team_id), game_date)] = game_id
+        fetched_at = fetched_at or datetime.date.today()
+        self.fetched_seasons[season] = fetched_at.isoformat()
+        self._series = None
+
+    def join(self, team_ids, game_dates) -> np.ndarray:
+        '''
+        Vectorized lookup of GAME_IDs for equally long arrays of team
+        ids and YYYY-MM-DD dates; misses come back as None.
+        '''
+        if self._series is None:
+            self._series = pd.Series(
+                list(self.game_ids.values()),
+                index=pd.MultiIndex.from_tuples(list(self.game_ids.keys()),
+                                                names=["TEAM_ID", "Date"]),
+                dtype=object)
+        keys = pd.MultiIndex.from_arrays([np.asarray(team_ids, dtype=np.int64),
+                                          np.asarray(game_dates, dtype=object)])
+        game_ids = self._series.reindex(keys).to_numpy(dtype=object, copy=True)
+        game_ids[pd.isna(game_ids)] = None
+        return game_ids
@@ -0,0 +1,143 @@
+import datetime
+import io
+import json
+import os
+
+import pandas as pd
+
+from server.game_id_index import season_end_date
+from server.seasons import current_season, season_label
+
+
+def seasons_between(first: str, last: str) -> list:
+    return [season_label(year) for year in range(int(first[:4]), int(last[:4]) + 1)]
+
+
+class GameLogPartitions:
+    '''
+    Game logs stored as one parquet partition per (season, team),
+    as returned by fetch_team_game_logs, plus a catalog.json listing
+    every partition with its row count and when it was fetched.
+
+    A partition fetched after its season ended is final: the games
+    can't change any more, so it is never fetched again. Only the
+    partitions of the running season are refreshed, and the combined
+    tables are reassembled from the partitions.
+
+    Partitions live under local_dir with the same relative names
+    (partition_name()) that are used to mirror them elsewhere, e.g.
+    in the bucket.
+    '''
+
+    catalog_name = "catalog.json"
+
+    def __init__(self, local_dir: str):
+        self.local_dir = local_dir
+        os.makedirs(local_dir, exist_ok=True)
+        try:
+            with open(self.path(self.catalog_name), "r", encoding="utf-8") as f:
+                self.catalog = json.load(f)
+        except (OSError, ValueError):
+            self.catalog = {}
+
+    @staticmethod
+    def partition_name(season: str, team_id) -> str:
+        return f"season={season}/team_id={team_id}.parquet"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.local_dir, name)
+
+    def catalog_json(self) -> str:
+        return json.dumps(self.catalog, sort_keys=True)
+
+    def _save_catalog(self) -> None:
+        path = self.path(self.catalog_name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.catalog_json())
+        os.replace(path + ".tmp", path)
+
+    def seasons(self) -> list:
+        return sorted(self.catalog)
+
+    def seasons_to_date(self, first_season: str) -> list:
+        '''
+        Every season from the earliest in the catalog (or first_season,
+        if that is earlier) up to the current one.
+        '''
+        return seasons_between(min(self.seasons() + [first_season]),
+                               current_season())
+
+    def entry(self, season: str, team_id):
+        return self.catalog.get(season, {}).get(str(team_id))
+
+    def is_final(self, season: str, team_id) -> bool:
+        entry = self.entry(season, team_id)
+        return (entry is not None and
+                datetime.date.fromisoformat(entry["fetched_at"]) >= season_end_date(season))
+
+    def to_fetch(self, seasons: list, team_ids: list) -> list:
+        '''
+        The (team_id, season) units among seasons x team_ids that
+        aren't final, in team-then-season order.
+        '''
+        return [(team_id, season) for team_id in team_ids for season in seasons
+                if not self.is_final(season, team_id)]
+
+    def put(self, season: str, team_id, df: pd.DataFrame,
+            fetched_at: datetime.date = None) -> str:
+        '''
+        Stores one partition and records it in the catalog. Returns
+        the partition's name.
+        '''
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        fetched_at = fetched_at or datetime.date.today()
+        return self._write(season, team_id, buffer.getvalue(), len(df),
+                           fetched_at.isoformat())
+
+    def _write(self, season: str, team_id, data: bytes, rows: int,
+               fetched_at: str) -> str:
+        name = self.partition_name(season, team_id)
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.catalog.setdefault(season, {})[str(team_id)] = {
+            "file": name, "rows": rows, "fetched_at": fetched_at}
+        self._save_catalog()
+        return name
+
+    def get(self, season: str, team_id) -> pd.DataFrame:
+        return pd.read_parquet(self.path(self.partition_name(season, team_id)))
+
+    def missing_from(self, other_catalog_json: str) -> list:
+        '''
+        Partitions of another copy's catalog (e.g. the bucket's) that
+        this copy lacks or only has an older fetch of, as
+        (season, team_id, entry) tuples.
+        '''
+        return _newer_entries(json.loads(other_catalog_json), self.catalog)
+
+    def newer_than(self, other_catalog_json: str) -> list:
+        '''
+        Partitions this copy has that another copy's catalog lacks or
+        only has an older fetch of, i.e. what has to be mirrored there.
+        '''
+        return _newer_entries(self.catalog, json.loads(other_catalog_json))
+
+    def adopt(self, season: str, team_id, entry: dict, data: bytes) -> None:
+        '''
+        Stores a partition copied from another copy of the store.
+        '''
+        self._write(season, team_id, data, entry["rows"], entry["fetched_at"])
+
+
+def _newer_entries(catalog: dict, other: dict) -> list:
+    newer = []
+    for season, teams in sorted(catalog.items()):
+        for team_id, entry in teams.items():
+            own = other.get(season, {}).get(team_id)
+            if own is None or own["fetched_at"] < entry["fetched_at"]:
+                newer.append((season, team_id, entry))
+    return newer
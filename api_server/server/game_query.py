@@ -0,0 +1,184 @@
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Columns returned per game by GameQueryStore.games
+GAME_QUERY_COLUMNS = ['GAME_ID', 'GAME_DATE', 'SEASON_YEAR', 'TEAM_ID',
+                      'TEAM_ABBREVIATION', 'TEAM_NAME', 'OPP', 'HOME', 'WL',
+                      'PTS', 'PLUS_MINUS', 'ATTENDANCE']
+
+# Groupings of the home win rate aggregate and their columns
+WIN_RATE_GROUPS = {'team': ['TEAM_ID', 'TEAM_ABBREVIATION', 'TEAM_NAME'],
+                   'season': ['SEASON_YEAR']}
+
+
+class GameQueryStore:
+    '''
+    The game fact table (one row per game and team, see
+    build_game_facts) held in memory as one numpy array per column,
+    in the table's (TEAM_ID, SEASON_YEAR, GAME_ID) order. Two indexes
+    narrow a query down before any column is scanned:
+
+    - per team, and per team and season, the contiguous range of their
+      rows, since the table is sorted by them;
+    - per date, the rows ordered by GAME_DATE, so a date range is two
+      binary searches.
+
+    The remaining filters only look at the rows the indexes selected.
+    '''
+
+    def __init__(self, facts: pd.DataFrame):
+        facts = facts.reset_index()
+        self.rows = len(facts)
+        self.columns = {}
+        for column in GAME_QUERY_COLUMNS + ['WIN']:
+            values = facts[column]
+            if column == 'GAME_DATE':
+                values = pd.to_datetime(values.astype(str).str[:10]).to_numpy("datetime64[D]")
+            elif column == 'ATTENDANCE':
+                # -1 for games without attendance, which no filter selects
+                values = values.astype("Int64").fillna(-1).to_numpy("int64")
+            elif isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(str).to_numpy()
+            else:
+                values = values.to_numpy()
+            self.columns[column] = values
+
+        team_ids = self.columns['TEAM_ID']
+        seasons = self.columns['SEASON_YEAR']
+        starts = np.flatnonzero(np.r_[True, (team_ids[1:] != team_ids[:-1])
+                                      | (seasons[1:] != seasons[:-1])])
+        stops = np.r_[starts[1:], self.rows]
+        self.team_season_ranges = {(int(team_ids[start]), seasons[start]): (start, stop)
+                                   for start, stop in zip(starts, stops)}
+        self.team_ranges = {}
+        for (team_id, _), (start, stop) in self.team_season_ranges.items():
+            first, _ = self.team_ranges.get(team_id, (start, stop))
+            self.team_ranges[team_id] = (first, stop)
+
+        self.date_order = np.argsort(self.columns['GAME_DATE'], kind="stable")
+        self.sorted_dates = self.columns['GAME_DATE'][self.date_order]
+
+        self.team_lookup = {}
+        for column in ['TEAM_ABBREVIATION', 'TEAM_NAME']:
+            for team_id, (start, _) in self.team_ranges.items():
+                self.team_lookup[str(self.columns[column][start]).lower()] = team_id
+        self._win_rates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_parquet(cls, data: bytes):
+        return cls(pd.read_parquet(io.BytesIO(data)))
+
+    def team_id(self, team: str):
+        '''
+        Resolves a team id, abbreviation or name; None if unknown.
+        '''
+        if team.isdigit():
+            return int(team) if int(team) in self.team_ranges else None
+        return self.team_lookup.get(team.lower())
+
+    def select(self, team_id: int = None, season: str = None, date_from=None,
+               date_to=None, min_attendance: int = None, home: bool = None):
+        '''
+        Positions of the rows matching every given filter, in table
+        order. A team (and season) selects its row range; otherwise a
+        date range selects its rows through the date index.
+        '''
+        if team_id is not None:
+            start, stop = (self.team_season_ranges.get((team_id, season), (0, 0))
+                           if season is not None
+                           else self.team_ranges.get(team_id, (0, 0)))
+            rows = np.arange(start, stop)
+        elif date_from is not None or date_to is not None:
+            start = 0 if date_from is None else \
+                np.searchsorted(self.sorted_dates, np.datetime64(date_from, "D"), "left")
+            stop = self.rows if date_to is None else \
+                np.searchsorted(self.sorted_dates, np.datetime64(date_to, "D"), "right")
+            rows = np.sort(self.date_order[start:stop])
+        else:
+            rows = np.arange(self.rows)
+
+        mask = np.ones(len(rows), dtype=bool)
+        if season is not None and team_id is None:
+            mask &= self.columns['SEASON_YEAR'][rows] == season
+        if team_id is not None:
+            dates = self.columns['GAME_DATE'][rows]
+            if date_from is not None:
+                mask &= dates >= np.datetime64(date_from, "D")
+            if date_to is not None:
+                mask &= dates <= np.datetime64(date_to, "D")
+        if min_attendance is not None:
+            mask &= self.columns['ATTENDANCE'][rows] >= min_attendance
+        if home is not None:
+            mask &= self.columns['HOME'][rows] == home
+        return rows[mask]
+
+    def games(self, rows) -> list:
+        '''
+        The selected rows as records of GAME_QUERY_COLUMNS.
+        '''
+        values = {}
+        for column in GAME_QUERY_COLUMNS:
+            column_values = self.columns[column][rows]
+            if column == 'GAME_DATE':
+                column_values = np.datetime_as_string(column_values)
+            column_values = column_values.tolist()
+            if column == 'ATTENDANCE':
+                column_values = [None if value < 0 else value for value in column_values]
+            values[column] = column_values
+        return [dict(zip(values, record)) for record in zip(*values.values())]
+
+    def home_win_rate(self, group_by: tuple) -> list:
+        '''
+        Home games, wins and win rate per group (team and/or season,
+        see WIN_RATE_GROUPS), computed once per grouping.
+        '''
+        with self._lock:
+            if group_by not in self._win_rates:
+                self._win_rates[group_by] = self._home_win_rate(group_by)
+            return self._win_rates[group_by]
+
+    def _home_win_rate(self, group_by: tuple) -> list:
+        home = self.columns['HOME']
+        keys = [column for group in group_by for column in WIN_RATE_GROUPS[group]]
+        frame = pd.DataFrame({column: self.columns[column][home] for column in keys})
+        frame['WIN'] = self.columns['WIN'][home]
+        if not keys:
+            frame['ALL'] = 0
+            keys = ['ALL']
+        rates = frame.groupby(keys, sort=True, observed=True)['WIN'].agg(['size', 'sum'])
+        rates = rates.rename(columns={'size': 'HOME_GAMES', 'sum': 'HOME_WINS'}).reset_index()
+        rates['HOME_WIN_RATE'] = (rates['HOME_WINS'] / rates['HOME_GAMES']).round(3)
+        return rates.drop(columns=['ALL'], errors='ignore').to_dict("records")
+
+
+class GameQueryCache:
+    '''
+    The GameQueryStore of the latest published game facts, rebuilt
+    only when the artifact's ETag changed (see PublishedArtifactCache).
+    '''
+
+    def __init__(self, published_artifacts, name: str = "game_facts.parquet"):
+        self.published_artifacts = published_artifacts
+        self.name = name
+        self._etag = None
+        self._store = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        '''
+        Returns the store, or None if the game facts were never
+        published.
+        '''
+        artifact = self.published_artifacts.get(self.name)
+        if artifact is None:
+            return None
+        data, etag = artifact
+        with self._lock:
+            if etag != self._etag:
+                self._store = GameQueryStore.from_parquet(data)
+                self._etag = etag
+            return self._store
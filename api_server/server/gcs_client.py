@@ -0,0 +1,78 @@
+import functools
+import gzip
+import logging
+import threading
+import time
+
+from google.oauth2 import service_account
+from google.cloud import storage
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+_setup_lock = threading.Lock()
+_setup_seconds = []
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client(project_id: str,
+                       service_account_key: str) -> storage.Client:
+    '''
+    Process-wide storage client for a (project, service account key).
+    The key file is read and the client built on first use only;
+    later calls reuse the client, its refreshed access token and its
+    pooled HTTP connections.
+    '''
+    start = time.perf_counter()
+    credentials = service_account.Credentials.\
+        from_service_account_file(service_account_key)
+    client = storage.Client(project=project_id, credentials=credentials)
+    elapsed = time.perf_counter() - start
+    with _setup_lock:
+        _setup_seconds.append(elapsed)
+    logger.info(f"Created storage client for {project_id} "
+                f"in {elapsed * 1000:.1f} ms")
+    return client
+
+
+def storage_client_stats() -> dict:
+    '''
+    How many clients were built and how long that took, and how many
+    calls got the cached client instead. Every storage operation
+    counts as such a call, including several per upload or download,
+    where the code before the cache built one client per upload or
+    download. setup_seconds_saved_upper_bound (those calls times the
+    mean setup time) is therefore a rough upper bound of the setup
+    the cache saved, not a measurement.
+    '''
+    cache_info = get_storage_client.cache_info()
+    with _setup_lock:
+        setup_seconds = sum(_setup_seconds)
+        clients_created = len(_setup_seconds)
+    mean_setup = setup_seconds / max(clients_created, 1)
+    return {"clients_created": clients_created,
+            "setup_seconds": setup_seconds,
+            "cached_client_calls": cache_info.hits,
+            "setup_seconds_saved_upper_bound": cache_info.hits * mean_setup}
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    '''
+    gzip-compresses data for an upload with Content-Encoding: gzip.
+    The header's mtime is zeroed, so the same content always
+    compresses to the same bytes.
+    '''
+    return gzip.compress(data, mtime=0)
+
+
+def download_blob_bytes(blob) -> bytes:
+    '''
+    Downloads an object as stored, without GCS decompressing it on the
+    way, and gunzips it if it was uploaded gzip-compressed, so callers
+    get the original bytes whichever way it was published.
+    '''
+    data = blob.download_as_bytes(raw_download=True)
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return data
@@ -1,7 +1,15 @@
 from nba_api.stats.endpoints import teamgamelogs
+import numpy as np
 import pandas as pd
+import json
+import requests
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm  
+from server.checkpoint import JobManifest
+from server.game_log_partitions import GameLogPartitions
 
 
 useful_stats = ['TEAM_ID','SEASON_WINRATE', 'HOME_WINRATE', 'GAME_ID','FGM','FGA','FG_PCT','FG3M','FG3A','FG3_PCT','FTM','FTA','FT_PCT',
@@ -40,59 +48,325 @@ name_to_id = {
     'Washington Wizards': 1610612764
 }
 
-def get_team_game_logs(team_id, season="2020-21", season_type="Regular Season"):
+def fetch_team_game_logs(team_id, season="2020-21", season_type="Regular Season"):
     """
-    Get all home games for a specific team in a season
+    Fetches one team's game logs for a season, one row per game.
+    Raises on any failure so the caller can decide whether to retry.
     """
-    try:
-        game_logs = teamgamelogs.TeamGameLogs(
+    game_logs = teamgamelogs.TeamGameLogs(
         team_id_nullable=team_id,
         season_nullable=season,
         season_type_nullable=season_type,
         timeout=30
     )
-    #   LOOKING AT ONE TEAM IN ONE SPECIFIC SEASON, EACH ROW IS ONE GAME
-
-        df = game_logs.get_data_frames()[0]
-        df['SEASON_WINRATE'] = round((df['WL']=='W').mean(), 3)
-        df['WIN'] = (df['WL']=='W').astype('int64')
-        df['HOME'] = df['MATCHUP'].str.contains('vs.', na=False)
-        df["OPP"] = df["MATCHUP"].str[-3:]
-        df['EFGP'] = (df['FGM'] + 0.5 * df['FG3M']) / df['FGA']
-        df['TOVP'] = df['TOV'] / (df['FGA'] + 0.44 * df['FTA'] + df['TOV'])
-        df['FTR'] = df['FTA'] / df['FGA']
-        home = df[df['HOME']].copy()
-        home['HOME_WINRATE'] = round(home['WIN'].mean(), 3)
-        away = df[~df['HOME']].copy()
-        away['AWAY_WINRATE'] = round(away['WIN'].mean(), 3)
-        return home, away
-
-        
+    return game_logs.get_data_frames()[0]
+
+# Repeated strings stored as categoricals in the combined tables
+CATEGORY_COLUMNS = ['SEASON_YEAR', 'TEAM_ABBREVIATION', 'TEAM_NAME', 'MATCHUP',
+                    'WL', 'OPP']
+
+def compact_dtypes(df) -> dict:
+    """
+    Compact dtypes for the box-score columns of raw game logs: the
+    smallest integer type that holds each count column (int8/int16
+    for most) and float32 for percentages and other floats.
+    """
+    dtypes = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            low, high = (values.min(), values.max()) if len(values) else (0, 0)
+            dtypes[column] = next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                                  if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max)
+        elif pd.api.types.is_float_dtype(values):
+            dtypes[column] = np.float32
+    return dtypes
+
+def build_game_log_tables(team_season_dfs):
+    """
+    Combines raw game logs, one DataFrame per team/season, into the
+    home and away tables. The combined table is downcast (categoricals
+    for the repeated strings, see compact_dtypes for the numbers), the
+    derived stats (WIN, HOME, OPP, EFGP, TOVP, FTR and the season, home
+    and away win rates per team/season) are computed once on it, and
+    home and away are selected with the HOME mask.
+
+    Empty frames (e.g. a season that hasn't tipped off yet, which
+    nba_api returns with object columns) are left out, so they don't
+    turn every column of the combined table into object.
+    """
+    frames = list(team_season_dfs)
+    frames = [df for df in frames if not df.empty] or frames[:1]
+    team_season = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+    df = pd.concat(frames, ignore_index=True)
+    del frames
+    dtypes = compact_dtypes(df)
+    dtypes.update({column: "category" for column in CATEGORY_COLUMNS
+                   if column in df.columns})
+    df = df.astype(dtypes)
+
+    win = df['WL'] == 'W'
+    df['SEASON_WINRATE'] = win.groupby(team_season).transform("mean").round(3).astype("float32")
+    df['WIN'] = win.astype("int8")
+    df['HOME'] = df['MATCHUP'].str.contains('vs.', na=False).astype(bool)
+    df['OPP'] = df['MATCHUP'].str[-3:].astype("category")
+    df['EFGP'] = ((df['FGM'] + 0.5 * df['FG3M']) / df['FGA']).astype("float32")
+    df['TOVP'] = (df['TOV'] / (df['FGA'] + 0.44 * df['FTA'] + df['TOV'])).astype("float32")
+    df['FTR'] = (df['FTA'] / df['FGA']).astype("float32")
+    venue_winrate = win.groupby([team_season, df['HOME'].to_numpy()]).transform("mean")
+    venue_winrate = venue_winrate.round(3).astype("float32").to_numpy()
+
+    home_mask = df['HOME'].to_numpy()
+    home = df[home_mask].reset_index(drop=True)
+    home['HOME_WINRATE'] = venue_winrate[home_mask]
+    away = df[~home_mask].reset_index(drop=True)
+    away['AWAY_WINRATE'] = venue_winrate[~home_mask]
+    return home, away
+
+def split_team_game_logs(df):
+    """
+    Adds the derived stats to one team/season of game logs and splits
+    it into home and away games.
+    """
+    return build_game_log_tables([df])
+
+def get_team_game_logs(team_id, season="2020-21", season_type="Regular Season"):
+    """
+    Get all home games for a specific team in a season
+    """
+    try:
+        #   LOOKING AT ONE TEAM IN ONE SPECIFIC SEASON, EACH ROW IS ONE GAME
+        df = fetch_team_game_logs(team_id, season, season_type)
+        return split_team_game_logs(df)
+
     except Exception as e:
         print(f"Error fetching data for team {team_id} season {season}: {e}")
         return None, None
 
-def get_useful_stats(year_range:list, name_to_id_dict: dict, save=False):
-    home_df_list, away_df_list = [], []
 
-    total_iterations = len(name_to_id_dict) * len(year_range)
+class GameLogFetchError(Exception):
+    """
+    Raised once every other team/season has been yielded when some
+    team/seasons still failed after all their retries.
+    """
+
+    def __init__(self, failed_units: list):
+        self.failed_units = failed_units
+        super().__init__(f"{len(failed_units)} team/seasons could not be "
+                         f"fetched: {', '.join(failed_units)}")
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Whether a failed stats.nba.com request means we're going too fast:
+    timeouts, dropped connections, 429s and 5xx. The API also answers
+    some throttled requests with a non-json error page.
+    """
+    if isinstance(error, (requests.exceptions.Timeout,
+                          requests.exceptions.ConnectionError,
+                          json.JSONDecodeError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AdaptiveRateController:
+    """
+    Paces request starts across worker threads with additive-increase,
+    multiplicative-decrease: every successful request shrinks the gap
+    between requests by `speedup` seconds, every throttling error
+    doubles it (and holds off the next request for that long), always
+    staying within [min_interval, max_interval].
+    """
+
+    def __init__(self, interval: float = 1.0, min_interval: float = 0.25,
+                 max_interval: float = 30.0, speedup: float = 0.05):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.speedup = speedup
+        self._next_start = 0.0
+        self._lock = threading.Lock()
 
-    with tqdm(total=total_iterations, desc="Fetching NBA Game Logs") as pbar:
-        for team_id in name_to_id_dict.values():
-            for year in year_range:
-                home_df, away_df = get_team_game_logs(team_id, season=year)
-                if home_df is not None and not home_df.empty:
-                    home_df_list.append(home_df)
-                if away_df is not None and not away_df.empty:
-                    away_df_list.append(away_df)
-                time.sleep(1)  # Increased from 0.5 to avoid rate limiting
-                pbar.update(1)
+    def wait(self) -> None:
+        """
+        Blocks until the calling thread may start a request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(start - now)
 
-    home_combined = pd.concat(home_df_list, ignore_index=True)
-    away_combined = pd.concat(away_df_list, ignore_index=True)
+    def success(self) -> None:
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval - self.speedup)
 
-    home_json = home_combined.to_json(orient="records", indent=2)
-    away_json = away_combined.to_json(orient="records", indent=2)
+    def throttled(self) -> None:
+        with self._lock:
+            self.interval = min(self.max_interval, self.interval * 2)
+            self._next_start = max(self._next_start,
+                                   time.monotonic() + self.interval)
+
+
+def fetch_team_season(team_id, season: str, controller: AdaptiveRateController,
+                      retries: int = 3):
+    """
+    Fetches one team/season's game logs, retrying up to `retries`
+    times and reporting every outcome to the rate controller. Raises
+    the last error once the retries are used up.
+    """
+    for attempt in range(retries + 1):
+        controller.wait()
+        try:
+            df = fetch_team_game_logs(team_id, season=season)
+        except Exception as e:
+            if is_throttling_error(e):
+                controller.throttled()
+            if attempt == retries:
+                raise
+            print(f"Retrying team {team_id} season {season} "
+                  f"({attempt + 1}/{retries}) after: {e}")
+            continue
+        controller.success()
+        return df
+
+
+def iter_fetched_game_logs(units: list, manifest: JobManifest = None,
+                           workers: int = 1, retries: int = 3,
+                           controller: AdaptiveRateController = None):
+    """
+    Fetches the game logs of (team_id, season) units on a pool of
+    `workers` threads paced by an AdaptiveRateController, and yields
+    (team_id, season, df) in the order of units. A unit that keeps
+    failing after `retries` retries is skipped and reported in the
+    GameLogFetchError raised at the end.
+
+    With a job manifest, each unit is checkpointed once fetched and
+    units completed by an earlier, failed run are loaded instead of
+    fetched again, so a retried job only refetches the failed units.
+    """
+    controller = controller or AdaptiveRateController()
+    failed_units = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            tqdm(total=len(units), desc="Fetching NBA Game Logs") as pbar:
+        # Keep a bounded window of units in flight and yield from its
+        # head, so results come out in order without holding them all.
+        window = deque()
+        pending = iter(units)
+
+        def fill_window():
+            while len(window) < 2 * workers:
+                team_id, year = next(pending, (None, None))
+                if team_id is None:
+                    return
+                unit = f"{team_id}/{year}"
+                if manifest is not None and manifest.is_done(unit):
+                    window.append((team_id, year, unit, None))
+                else:
+                    window.append((team_id, year, unit, executor.submit(
+                        fetch_team_season, team_id, year, controller, retries)))
+
+        fill_window()
+        while window:
+            team_id, year, unit, future = window.popleft()
+            if future is None:
+                df = manifest.load(unit)
+            else:
+                try:
+                    df = future.result()
+                except Exception as e:
+                    print(f"Giving up on team/season {unit}: {e}")
+                    failed_units.append(unit)
+                    df = None
+                else:
+                    if manifest is not None:
+                        manifest.save(unit, df)
+            fill_window()
+            pbar.update(1)
+            if df is not None:
+                yield team_id, year, df
+
+    if failed_units:
+        raise GameLogFetchError(failed_units)
+
+
+def iter_team_game_logs(year_range: list, name_to_id_dict: dict,
+                        manifest: JobManifest = None, **fetch_options):
+    """
+    Fetches the raw game logs of every team in every season and
+    yields them in team-then-season order. See iter_fetched_game_logs
+    for the manifest and fetch_options (workers, retries, controller).
+    """
+    units = [(team_id, year) for team_id in name_to_id_dict.values()
+             for year in year_range]
+    for _, _, df in iter_fetched_game_logs(units, manifest, **fetch_options):
+        yield df
+
+
+def refresh_game_log_partitions(partitions: GameLogPartitions, seasons: list,
+                                team_ids: list, manifest: JobManifest = None,
+                                **fetch_options) -> int:
+    """
+    Fetches and stores every partition of seasons x team_ids that
+    isn't final yet, which after the first run is only the current
+    season's. Returns the number of partitions fetched. See
+    iter_fetched_game_logs for the other arguments.
+    """
+    units = partitions.to_fetch(seasons, team_ids)
+    print(f"Refreshing {len(units)} of {len(seasons) * len(team_ids)} "
+          f"team/season partitions")
+    for team_id, season, df in iter_fetched_game_logs(units, manifest,
+                                                      **fetch_options):
+        partitions.put(season, team_id, df)
+    return len(units)
+
+
+def iter_partitioned_game_logs(partitions: GameLogPartitions, seasons: list,
+                               team_ids: list):
+    """
+    Yields the raw game logs of every stored partition of seasons x
+    team_ids in team-then-season order.
+    """
+    for team_id in team_ids:
+        for season in seasons:
+            if partitions.entry(season, team_id) is not None:
+                yield partitions.get(season, team_id)
+
+
+def iter_game_data_seasons(home_df, away_df):
+    """
+    Splits the home and away tables by SEASON_YEAR and yields
+    (season, home, away) per season in season order. The parts keep
+    the full tables' dtypes, categories included, so they concatenate
+    back losslessly.
+    """
+    home_groups = dict(iter(home_df.groupby('SEASON_YEAR', observed=True, sort=False)))
+    away_groups = dict(iter(away_df.groupby('SEASON_YEAR', observed=True, sort=False)))
+    for season in sorted(set(home_groups) | set(away_groups)):
+        yield (season,
+               home_groups.get(season, home_df.iloc[:0]).reset_index(drop=True),
+               away_groups.get(season, away_df.iloc[:0]).reset_index(drop=True))
+
+
+def get_useful_stats(year_range:list, name_to_id_dict: dict, save=False,
+                     manifest: JobManifest = None, as_json=False,
+                     **fetch_options):
+    """
+    Fetches the game logs of every team in every season and combines
+    them into home and away tables. The json versions of the tables
+    are only built when as_json is set. See iter_team_game_logs for
+    the manifest, fetch_options (workers, retries, controller) and
+    failed team/seasons. The endpoints build the tables from
+    GameLogPartitions instead, so only the current season is fetched.
+    """
+    home_combined, away_combined = build_game_log_tables(
+        iter_team_game_logs(year_range, name_to_id_dict, manifest,
+                            **fetch_options))
 
     if save:
         home_combined.to_csv("HOME_GAMES.csv", index=False)
@@ -100,10 +374,22 @@ def get_useful_stats(year_range:list, name_to_id_dict: dict, save=False):
         print(f"Saved {len(home_combined)} total games to HOME_GAMES.csv")
         print(f"Saved {len(away_combined)} total games to AWAY_GAMES.csv")
         return None
-    else:
-        return home_combined, away_combined, home_json, away_json
+
+    home_json = away_json = None
+    if as_json:
+        home_json = home_combined.to_json(orient="records", indent=2)
+        away_json = away_combined.to_json(orient="records", indent=2)
+    return home_combined, away_combined, home_json, away_json
 
 if __name__ == "__main__":
-    years = ["2013-14", "2014-15", "2015-16", "2016-17", "2017-18", "2018-19", "2019-20", 
-         "2020-21", "2021-22", "2022-23", "2023-24"]
-    get_useful_stats(years, name_to_id, save=True)
\ No newline at end of file
+    from server.define_variables import game_log_partition_dir, game_log_first_season
+    partitions = GameLogPartitions(game_log_partition_dir)
+    years = partitions.seasons_to_date(game_log_first_season)
+    team_ids = list(dict.fromkeys(name_to_id.values()))
+    refresh_game_log_partitions(partitions, years, team_ids)
+    home_combined, away_combined = build_game_log_tables(
+        iter_partitioned_game_logs(partitions, years, team_ids))
+    home_combined.to_csv("HOME_GAMES.csv", index=False)
+    away_combined.to_csv("AWAY_GAMES.csv", index=False)
+    print(f"Saved {len(home_combined)} total games to HOME_GAMES.csv")
+    print(f"Saved {len(away_combined)} total games to AWAY_GAMES.csv")
\ No newline at end of file
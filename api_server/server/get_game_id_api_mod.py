@@ -2,6 +2,8 @@ import json
 from nba_api.stats.endpoints import leaguegamefinder
 from tqdm import tqdm
 import time
+from server.game_id_index import GameIdIndex
+from server.seasons import season_for_date
 
 name_to_id = {
     'Atlanta Hawks': 1610612737,
@@ -36,36 +38,70 @@ name_to_id = {
     'Charlotte Hornets': 1610612766,
     'Charlotte Bobcats': 1610612766
 }
-def get_team_games_lookup(team_id):
-    gamefinder = leaguegamefinder.LeagueGameFinder(team_id_nullable=team_id)
+def get_league_games_lookup(season: str) -> dict:
+    """
+    Gets every team's games of one season with a single league-wide
+    LeagueGameFinder call. Returns {team_id: {game_date: game_id}}.
+    """
+    gamefinder = leaguegamefinder.LeagueGameFinder(
+        player_or_team_abbreviation="T",
+        league_id_nullable="00",
+        season_nullable=season,
+        timeout=30)
     games_df = gamefinder.get_data_frames()[0]
-    return dict(zip(games_df['GAME_DATE'], games_df['GAME_ID']))
+    lookups = {}
+    for team_id, game_date, game_id in zip(games_df['TEAM_ID'].tolist(),
+                                           games_df['GAME_DATE'].tolist(),
+                                           games_df['GAME_ID'].tolist()):
+        lookups.setdefault(team_id, {})[game_date] = game_id
+    return lookups
 
-def get_game_id_from_json(json_str: str, name_to_id_dict: dict):
-    print("Fetching game lookups for all teams")
-    game_logs = {}
-    for team_name, team_id in tqdm(name_to_id_dict.items(), desc="Fetching team games"):
-        game_logs[team_id] = get_team_games_lookup(team_id)
+def update_game_id_index(index: GameIdIndex, games_data: dict, name_to_id_dict: dict):
+    """
+    Fetches the seasons whose dates are missing from the index (one
+    league-wide request each) and adds them to it. Seasons that were
+    already fetched after they ended are never fetched again.
+    """
+    keys = [(name_to_id_dict[team_name], game['Date'])
+            for team_name, games in games_data.items()
+            if name_to_id_dict.get(team_name)
+            for game in games]
+    seasons = index.seasons_to_fetch(keys, season_for_date)
+    print(f"Game id index has {len(index)} games, fetching {len(seasons)} seasons")
+    for season in tqdm(seasons, desc="Fetching league games"):
+        index.update(season, get_league_games_lookup(season))
         time.sleep(1)  # Rate limiting
+
+def get_game_id_from_json(json_str: str, name_to_id_dict: dict, index: GameIdIndex):
+    """
+    Adds a GameID to every game in the attendance json. Only dates
+    missing from the index trigger LeagueGameFinder requests (one
+    league-wide request per season) and the index is updated in place.
+    """
+    print("Fetching game lookups for all teams")
     games_data = json.loads(json_str)
+    update_game_id_index(index, games_data, name_to_id_dict)
     print("Adding GameIDs to entries")
+    misses = {}
     for team_name, games in tqdm(games_data.items(), desc="Processing teams"):
         team_id = name_to_id_dict.get(team_name)
         if not team_id:
             print(f"Skipping unknown team: {team_name}")
             continue
 
-        team_lookup = game_logs.get(team_id, {})
-        
-        for game in games:
-            game_date = game['Date']
-            game_id = team_lookup.get(game_date)
-            
+        game_ids = index.join([team_id] * len(games),
+                              [game['Date'] for game in games])
+
+        for game, game_id in zip(games, game_ids):
             if game_id:
                 game['GameID'] = str(game_id)
             else:
-                print(f"No GameID found for {team_name} on {game_date}")
+                misses[team_name] = misses.get(team_name, 0) + 1
+    if misses:
+        summary = ", ".join(f"{team_name} ({count})"
+                            for team_name, count in sorted(misses.items()))
+        print(f"No GameID found for {sum(misses.values())} games: {summary}")
     return games_data
 
 if __name__=="__main__":
-    get_game_id_from_json("data/data.json", name_to_id)
\ No newline at end of file
+    get_game_id_from_json("data/data.json", name_to_id, GameIdIndex())
\ No newline at end of file
@@ -1,126 +1,612 @@
+import asyncio
+import datetime
 import io
+import threading
+import aiohttp
+import numpy as np
 import pandas as pd
 import requests
 import time
 import logging
+from urllib.parse import urlparse
+from lxml import etree
 from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from server.checkpoint import JobManifest
+from server.http_cache import ResponseCache
+from server.seasons import SEASON_START_MONTH, season_start_year
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def scrape_nba_attendance_data() -> pd.DataFrame:
+BREF_BASE_URL = "https://www.basketball-reference.com"
+SCHEDULE_MONTHS = ["october", "november", "december", "january",
+                   "february", "march", "april", "may", "june"]
+# First season (by end year) of a full scrape, and the seasons it
+# skips due to varying Covid restrictions on attendance
+FIRST_SEASON = 2014
+SKIPPED_SEASONS = (2020, 2021)
+BREF_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Cache-Control": "max-age=0"
+}
+# basketball-reference blocks clients making more than 20 requests
+# per minute, so stay a little under that by default.
+BREF_REQUESTS_PER_MINUTE = 18
+BREF_BURST = 3
+BREF_MAX_IN_FLIGHT = 3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# data-stat attribute of each schedule table cell we use, mapped to
+# the column name pd.read_html gives it.
+SCHEDULE_COLUMNS = {
+    "date_game": "Date",
+    "visitor_team_name": "Visitor/Neutral",
+    "visitor_pts": "PTS",
+    "home_team_name": "Home/Neutral",
+    "home_pts": "PTS.1",
+    "attendance": "Attend.",
+}
+SCHEDULE_NUMERIC_COLUMNS = ["PTS", "PTS.1", "Attend."]
+
+
+class HostRateLimiter:
     '''
-    Scrapes data from basketball-reference.com for the last
-    10 seasons' worth of NBA games and puts them into a
-    dataframe.  2020 and 2021 are skipped due to varying
-    Covid restrictions on attendance.
+    Token bucket rate limiter with one bucket per host. Each host
+    refills at requests_per_minute and holds at most burst tokens.
+    Callers reserve a token and wait out any deficit, so concurrent
+    callers are queued fairly instead of all firing at once. Usable
+    from both threads and asyncio tasks.
     '''
 
+    def __init__(self, requests_per_minute: float = BREF_REQUESTS_PER_MINUTE,
+                 burst: int = BREF_BURST):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.set_budget(requests_per_minute, burst)
+
+    def set_budget(self, requests_per_minute: float, burst: int) -> None:
+        '''
+        Changes the refill rate and burst of every host's bucket; the
+        tokens they hold are kept (up to the new burst).
+        '''
+        if requests_per_minute <= 0 or burst < 1:
+            raise ValueError("requests_per_minute must be positive "
+                             "and burst at least 1")
+        with self._lock:
+            self.rate = requests_per_minute / 60
+            self.burst = burst
+
+    def _reserve(self, url: str) -> float:
+        '''
+        Takes one token for the url's host and returns the number of
+        seconds the caller has to wait before using it.
+        '''
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def pause(self, url: str, seconds: float) -> None:
+        '''
+        Drains the url's host bucket so nobody sends to it for the
+        next `seconds`, e.g. after a 429 with a Retry-After header.
+        '''
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            tokens = min(tokens, -seconds * self.rate)
+            self._buckets[host] = (tokens, now)
+
+    def wait(self, url: str) -> None:
+        time.sleep(self._reserve(url))
+
+    async def acquire(self, url: str) -> None:
+        await asyncio.sleep(self._reserve(url))
+
+
+# The one limiter of this process: every scrape draws from the same
+# per-host budget, however many run at once
+SHARED_RATE_LIMITER = HostRateLimiter()
+
+
+def schedule_page_url(year: int, month: str) -> str:
+    return f"{BREF_BASE_URL}/leagues/NBA_{year}_games-{month}.html"
+
+
+def _retry_delay(retry_after, attempt: int, backoff_factor: float) -> float:
+    '''
+    Seconds to wait before retrying, honouring a numeric Retry-After
+    header when the server sends one.
+    '''
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return backoff_factor * (2 ** attempt)
+
+
+def season_is_complete(year: int, today: datetime.date = None) -> bool:
+    '''
+    A season (named by its end year) is over once the Finals are,
+    after which its schedule pages never change.
+    '''
+    today = today or datetime.date.today()
+    return today >= datetime.date(year, 7, 1)
+
+
+def latest_season(today: datetime.date = None) -> int:
+    '''
+    End year of the most recent season that has started, e.g. 2025
+    for the 2024-25 season. Over the summer this is the season that
+    just finished.
+    '''
+    return season_start_year(today or datetime.date.today()) + 1
+
+
+def default_seasons(today: datetime.date = None) -> list:
+    '''
+    Seasons of a full scrape: FIRST_SEASON up to and including the
+    latest season, so a full refresh keeps the current season's games.
+    '''
+    return [year for year in range(FIRST_SEASON, latest_season(today) + 1)
+            if year not in SKIPPED_SEASONS]
+
+
+def months_played(year: int, today: datetime.date = None) -> list:
+    '''
+    Schedule months of a season that have already started, so an
+    incremental refresh doesn't fetch pages of future games.
+    '''
+    today = today or datetime.date.today()
+    months = []
+    for month in SCHEDULE_MONTHS:
+        month_number = datetime.datetime.strptime(month, "%B").month
+        month_year = year - 1 if month_number >= SEASON_START_MONTH else year
+        if datetime.date(month_year, month_number, 1) <= today:
+            months.append(month)
+    return months
+
+
+def _cached_page(cache: ResponseCache, year: int, month: str) -> tuple:
+    '''
+    Looks a schedule page up in the response cache. Returns
+    (html, entry): html is set when the cache can answer without a
+    request (the page is pinned or we are offline), otherwise entry
+    is whatever is cached for a conditional GET.
+    '''
+    if cache is None:
+        return None, None
+    entry = cache.get(schedule_page_url(year, month))
+    if entry is not None and (entry["immutable"] or cache.offline):
+        logger.info(f"Cache hit: year={year}, month={month}")
+        return entry["body"], entry
+    if entry is None and cache.offline:
+        logger.warning(f"Offline and not cached: year={year}, month={month}")
+    return None, entry
+
+
+def _page_from_response(cache: ResponseCache, entry, year: int, month: str,
+                        status: int, html: str, headers) -> str:
+    '''
+    Turns a schedule page response into its html, answering 304s
+    from the cache and storing fresh 200s in it. Returns None for
+    pages that are missing or failed.
+    '''
+    url = schedule_page_url(year, month)
+    if status == 304 and entry is not None:
+        logger.info(f"Not modified: year={year}, month={month}")
+        cache.revalidated(url, immutable=season_is_complete(year))
+        return entry["body"]
+    if status == 404:
+        logger.warning(f"Page not found: year={year}, month={month}")
+        return None
+    elif status != 200:
+        logger.error(f"HTTP {status} for year={year}, month={month}")
+        return None
+    logger.info(f"Successfully fetched: year={year}, month={month}")
+    if cache is not None:
+        cache.put(url, html, etag=headers.get("ETag"),
+                  last_modified=headers.get("Last-Modified"),
+                  immutable=season_is_complete(year))
+    return html
+
+
+def read_html_schedule_table(html: str) -> pd.DataFrame:
+    '''
+    Parses a schedule page with pd.read_html, keeping the first
+    table on the page. Kept as the reference implementation that
+    parse_schedule_table is benchmarked against.
+    '''
+    tables = pd.read_html(io.StringIO(html))
+    return tables[0]
+
+
+def parse_schedule_table(html) -> pd.DataFrame:
+    '''
+    Streams through a schedule page and pulls only the columns we use
+    out of the table with id="schedule": Date, Visitor/Neutral, PTS,
+    Home/Neutral, PTS.1 and Attend. Repeated header rows and the
+    "Playoffs" separator are dropped, points and attendance come back
+    as float64 (NaN when blank) and parsing stops at the end of the
+    table instead of building the rest of the page.
+    '''
+    encoding = None
+    if isinstance(html, str):
+        html, encoding = html.encode("utf-8"), "utf-8"
+    values = {column: [] for column in SCHEDULE_COLUMNS.values()}
+    in_schedule = False
+    for event, element in etree.iterparse(io.BytesIO(html),
+                                          events=("start", "end"),
+                                          tag=("table", "tr"), html=True,
+                                          encoding=encoding):
+        if element.tag == "table":
+            if event == "start" and element.get("id") == "schedule":
+                in_schedule = True
+            elif event == "end" and in_schedule:
+                break
+            continue
+        if event != "end" or not in_schedule:
+            continue
+        is_header = ("thead" in (element.get("class") or "")
+                     or element.getparent().tag == "thead")
+        if not is_header:
+            row = {SCHEDULE_COLUMNS[cell.get("data-stat")]:
+                   "".join(cell.itertext()).strip()
+                   for cell in element
+                   if cell.get("data-stat") in SCHEDULE_COLUMNS}
+            if row.get("Date") not in (None, "", "Date", "Playoffs"):
+                for column, column_values in values.items():
+                    column_values.append(row.get(column, ""))
+        # Rows are only needed once, so free them as we go.
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    df = pd.DataFrame({column: np.array(column_values, dtype=object)
+                       for column, column_values in values.items()})
+    for column in SCHEDULE_NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column].str.replace(",", ""),
+                                   errors="coerce").astype("float64")
+    return df
+
+
+def _fetch_schedule_pages_sync(units: list, limiter: HostRateLimiter,
+                               on_page, cache: ResponseCache = None) -> None:
+    '''
+    Fetches the schedule pages one at a time, waiting on the rate
+    limiter before every request. Calls on_page(year, month, html) as
+    each page arrives, with html None for pages that don't exist.
+    '''
     # Setup session with retry logic
     session = requests.Session()
     retry_strategy = Retry(
         total=3,
         backoff_factor=2,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=list(RETRY_STATUSES),
         allowed_methods=["GET"]
     )
     adapter = HTTPAdapter(max_retries=retry_strategy)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
-    months = ["october", "november", "december", "january",
-            "february", "march", "april", "may", "june"]
-    all_years_df = []
+    for year, month in tqdm(units, desc="Schedule pages", unit="page"):
+        url = schedule_page_url(year, month)
+        html, entry = _cached_page(cache, year, month)
+        status = 200
+        if html is None and not (cache is not None and cache.offline):
+            limiter.wait(url)
+            headers = {**BREF_HEADERS,
+                       **(cache.conditional_headers(entry) if cache else {})}
+            response = session.get(url, headers=headers, timeout=30)
+            status = response.status_code
+            html = _page_from_response(cache, entry, year, month,
+                                       status, response.text,
+                                       response.headers)
+        if html is not None or status == 404:
+            on_page(year, month, html)
+
+
+async def _fetch_schedule_page_async(session: aiohttp.ClientSession,
+                                     limiter: HostRateLimiter,
+                                     in_flight: asyncio.Semaphore,
+                                     year: int, month: str, on_page,
+                                     cache: ResponseCache = None,
+                                     retries: int = 3,
+                                     backoff_factor: float = 2) -> None:
+    '''
+    Fetches one schedule page, retrying on 429/5xx and connection
+    errors, and hands it to on_page(year, month, html). html is None
+    when the page doesn't exist; pages that keep failing are skipped.
+    '''
+    url = schedule_page_url(year, month)
+    html, entry = _cached_page(cache, year, month)
+    if html is not None:
+        on_page(year, month, html)
+        return
+    if cache is not None and cache.offline:
+        return
+    request_headers = cache.conditional_headers(entry) if cache else {}
+    for attempt in range(retries + 1):
+        try:
+            async with in_flight:
+                await limiter.acquire(url)
+                async with session.get(url, headers=request_headers) as response:
+                    status = response.status
+                    headers = response.headers
+                    html = await response.text() if status == 200 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == retries:
+                raise
+            delay = _retry_delay(None, attempt, backoff_factor)
+            logger.warning(f"Request failed for year={year}, month={month}: "
+                           f"{e!r}, retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            continue
+        if status in RETRY_STATUSES and attempt < retries:
+            delay = _retry_delay(headers.get("Retry-After"), attempt,
+                                 backoff_factor)
+            logger.warning(f"HTTP {status} for year={year}, month={month}, "
+                           f"retrying in {delay:.0f}s")
+            # Back the whole host off, not just this request.
+            limiter.pause(url, delay)
+            continue
+        html = _page_from_response(cache, entry, year, month,
+                                   status, html, headers)
+        if html is not None or status == 404:
+            on_page(year, month, html)
+        return
+
+
+async def _fetch_schedule_pages_async(units: list, limiter: HostRateLimiter,
+                                      max_in_flight: int, on_page,
+                                      cache: ResponseCache = None) -> None:
+    '''
+    Fetches the schedule pages concurrently, with at most max_in_flight
+    requests open at once and the rate limiter pacing new requests.
+    Calls on_page(year, month, html) as each page arrives.
+    '''
+    in_flight = asyncio.Semaphore(max_in_flight)
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit_per_host=max_in_flight)
+    # Let aiohttp negotiate Accept-Encoding itself; it can only decode
+    # brotli when the optional brotli package is installed.
+    headers = {key: value for key, value in BREF_HEADERS.items()
+               if key != "Accept-Encoding"}
+    async with aiohttp.ClientSession(headers=headers, timeout=timeout,
+                                     connector=connector) as session:
+        tasks = [_fetch_schedule_page_async(session, limiter, in_flight,
+                                            year, month, on_page, cache)
+                 for year, month in units]
+        await tqdm_asyncio.gather(*tasks, desc="Schedule pages", unit="page")
+
+
+def iter_nba_attendance_months(years: list = None,
+                               months: list = None,
+                               use_async: bool = True,
+                               requests_per_minute: float = BREF_REQUESTS_PER_MINUTE,
+                               burst: int = BREF_BURST,
+                               max_in_flight: int = BREF_MAX_IN_FLIGHT,
+                               cache: ResponseCache = None,
+                               manifest: JobManifest = None):
+    '''
+    Scrapes basketball-reference one season at a time and yields
+    (year, month, dataframe) for every month with a schedule page,
+    in season/month order. Only one season's pages are held at once,
+    so memory doesn't grow with the number of seasons scraped.
+
+    Requests are paced by the per-host token buckets of
+    SHARED_RATE_LIMITER, set to requests_per_minute with the given
+    burst, which every scrape of the process shares. With use_async the
+    pages of a season are fetched concurrently (at most max_in_flight
+    at once), otherwise one after another.
 
+    With a response cache, pages of completed seasons are served from
+    disk and the rest are revalidated with conditional GETs; an
+    offline cache makes the scrape run without any network access.
+
+    With a job manifest, every parsed month is checkpointed as it
+    arrives and months completed by an earlier, failed run are loaded
+    from the checkpoint instead of fetched again.
+    '''
+    years = default_seasons() if years is None else years
+    months = SCHEDULE_MONTHS if months is None else months
+    limiter = SHARED_RATE_LIMITER
+    limiter.set_budget(requests_per_minute, burst)
+
+    for year in years:
+        month_dfs = {}
+
+        def on_page(year, month, html):
+            df_month = None if html is None else parse_schedule_table(html)
+            month_dfs[month] = df_month
+            if manifest is not None:
+                manifest.save(f"{year}/{month}", df_month)
+
+        if manifest is not None:
+            for month in months:
+                if manifest.is_done(f"{year}/{month}"):
+                    month_dfs[month] = manifest.load(f"{year}/{month}")
+        units = [(year, month) for month in months if month not in month_dfs]
+        if use_async:
+            asyncio.run(_fetch_schedule_pages_async(units, limiter,
+                                                    max_in_flight, on_page,
+                                                    cache))
+        else:
+            _fetch_schedule_pages_sync(units, limiter, on_page, cache)
+
+        games = 0
+        for month in months:
+            if month_dfs.get(month) is not None:
+                games += len(month_dfs[month])
+                yield year, month, month_dfs[month]
+        if games:
+            logger.info(f"Completed year {year}: {games} games")
+        else:
+            logger.warning(f"No schedule pages for year {year}")
+
+
+def scrape_nba_attendance_data(years: list = None,
+                               months: list = None,
+                               **scrape_options) -> pd.DataFrame:
+    '''
+    Scrapes data from basketball-reference.com for every season
+    since 2014 up to the current one (see default_seasons) and puts
+    them into a dataframe.  2020 and 2021 are skipped due to varying
+    Covid restrictions on attendance. years and months narrow the
+    scrape down to specific seasons (by end year) and months.
+
+    scrape_options are passed through to iter_nba_attendance_months:
+    use_async, requests_per_minute, burst, max_in_flight, cache and
+    manifest.
+    '''
     logger.info("Starting NBA attendance data scraping...")
     try:
-        for year in tqdm(range(2014, 2025), desc="Years", unit="year"):
-            all_months_df = []
-            if year == 2020 or year == 2021:
-                continue
-            for month in tqdm(months, desc=f"{year}", unit="month", leave=False):
-                url = (
-                    f"https://www.basketball-reference.com/"
-                    f"leagues/NBA_{year}_games-{month}.html"
-                    )
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "en-US,en;q=0.5",
-                    "Accept-Encoding": "gzip, deflate, br",
-                    "Connection": "keep-alive",
-                    "Upgrade-Insecure-Requests": "1",
-                    "Sec-Fetch-Dest": "document",
-                    "Sec-Fetch-Mode": "navigate",
-                    "Sec-Fetch-Site": "none",
-                    "Cache-Control": "max-age=0"
-                }
-                response = session.get(url, headers=headers, timeout=30)
-                time.sleep(6)
-                if response.status_code == 404:
-                    logger.warning(f"Page not found: year={year}, month={month}")
-                    continue
-                elif response.status_code != 200:
-                    logger.error(f"HTTP {response.status_code} for year={year}, month={month}")
-                    continue
-                logger.info(f"Successfully fetched: year={year}, month={month}")
-                html_table = io.StringIO(response.text)
-                tables = pd.read_html(html_table)
-                df_temp = tables[0]
-                all_months_df.append(df_temp)
-            df_single_year = pd.concat(all_months_df, ignore_index=True)
-            all_years_df.append(df_single_year)
-            logger.info(f"Completed year {year}: {len(df_single_year)} games")
+        all_months_df = [df_month for _, _, df_month in
+                         iter_nba_attendance_months(years, months,
+                                                    **scrape_options)]
     except Exception as e:
         logger.error(f"Scraping error: {e}", exc_info=True)
         raise
 
-    df = pd.concat(all_years_df, ignore_index=True)
+    if not all_months_df:
+        logger.warning("Scraping complete: no schedule pages found")
+        return pd.DataFrame()
+    df = pd.concat(all_months_df, ignore_index=True)
     logger.info(f"Scraping complete: {len(df)} total games")
     return df
 
 
+def iter_team_dictionaries(years: list = None, months: list = None,
+                           **scrape_options):
+    '''
+    Streaming counterpart of scrape -> clean -> create_nba_team_dictionary:
+    yields one team dictionary per scraped month, as it arrives.
+    '''
+    try:
+        for _, _, df_month in iter_nba_attendance_months(years, months,
+                                                         **scrape_options):
+            yield create_nba_team_dictionary(
+                clean_nba_attendance_data(df_month))
+    except Exception as e:
+        logger.error(f"Scraping error: {e}", exc_info=True)
+        raise
+
+
+def _schedule_dates(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, errors="coerce", format="%a, %b %d, %Y")
+
+
+def schedule_months(nba_attendance_df: pd.DataFrame) -> list:
+    '''
+    Months ("YYYY-MM") of the games on the scraped schedule pages,
+    played or not, i.e. the months a scrape has the full schedule of.
+    '''
+    if nba_attendance_df.empty:
+        return []
+    dates = _schedule_dates(nba_attendance_df["Date"]).dropna()
+    return sorted(dates.dt.strftime("%Y-%m").unique().tolist())
+
+
 def clean_nba_attendance_data(nba_attendance_df: pd.DataFrame) -> pd.DataFrame:
     '''
     Cleans raw dataframe by removing unnecessary columns and ensuring
-    null values are dealt with.
+    null values are dealt with. Games that haven't been played yet
+    (the season in progress lists them without scores) are dropped,
+    so they don't count as home losses.
     '''
 
     df = nba_attendance_df.drop(columns=
                         ["Start (ET)", "Unnamed: 6", "Unnamed: 7", "LOG",
                          "Notes"], errors="ignore")
+    df = df.dropna(subset=["PTS", "PTS.1"])
     df["Home_Win"] = df["PTS.1"] > df["PTS"]
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce",
-                                format="%a, %b %d, %Y")
+    df["Date"] = _schedule_dates(df["Date"])
     df = df.dropna(subset=["Date"]).reset_index(drop=True)
     return df 
 
 
+def _nullable_ints(values: pd.Series) -> list:
+    '''
+    Converts a column to a list of Python ints, with None where the
+    value is missing.
+    '''
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(
+        dtype="float64", na_value=np.nan)
+    missing = np.isnan(numbers)
+    ints = np.where(missing, 0, numbers).astype(np.int64).astype(object)
+    ints[missing] = None
+    return ints.tolist()
+
+
+def _nullable_bools(values: pd.Series) -> list:
+    '''
+    Converts a column to a list of Python bools, with None where the
+    value is missing.
+    '''
+    missing = values.isna().to_numpy()
+    bools = values.to_numpy(dtype=object).astype(bool).astype(object)
+    bools[missing] = None
+    return bools.tolist()
+
+
 def create_nba_team_dictionary(nba_attendance_clean_df: pd.DataFrame) -> dict:
     '''
     Creates a dictionary of scraped data with each NBA team as a key
     which maps to a list of dictionaries, each containing the following
     information per game: Date, Attendance, Points Scored, Home Win
+
+    Null handling and date formatting are done a column at a time;
+    teams keep the order they first appear in and games keep row order.
     '''
 
+    df = nba_attendance_clean_df
+    records = [
+        {"Date": date, "Attendance": attendance, "Points": points,
+         "HomeWin": home_win}
+        for date, attendance, points, home_win in zip(
+            df["Date"].dt.strftime("%Y-%m-%d").tolist(),
+            _nullable_ints(df["Attend."]),
+            _nullable_ints(df["PTS.1"]),
+            _nullable_bools(df["Home_Win"]))
+    ]
+
+    codes, teams = pd.factorize(df["Home/Neutral"], use_na_sentinel=False)
+    rows_by_team = np.argsort(codes, kind="stable")
+    ends = np.cumsum(np.bincount(codes, minlength=len(teams)))
     nba_team_dict = {}
-    for _, row in nba_attendance_clean_df.iterrows():
-        team = row["Home/Neutral"]
-        if team not in nba_team_dict:
-            nba_team_dict[team] = []
-        attendance = row["Attend."]
-        attendance = int(attendance) if pd.notna(attendance) else None
-        points = row["PTS.1"]
-        points = int(points) if pd.notna(points) else None
-        home_win = row["Home_Win"]
-        home_win = bool(home_win) if pd.notna(home_win) else None
-        nba_team_dict[team].append({
-            "Date": row["Date"].strftime("%Y-%m-%d"),
-            "Attendance": attendance,
-            "Points": points,
-            "HomeWin": home_win
-        })
+    start = 0
+    for team, end in zip(teams, ends):
+        nba_team_dict[team] = [records[i] for i in rows_by_team[start:end]]
+        start = end
     return nba_team_dict
+
+
+def merge_team_dictionaries(existing: dict, new: dict, months: list) -> dict:
+    '''
+    Merges freshly scraped games into a previously built team
+    dictionary. months ("YYYY-MM", see schedule_months) are the months
+    that were scraped again: every team's games in them are replaced
+    by the ones in new, so postponed or rescheduled games don't keep a
+    stale entry. Games of other months are kept as they were; the new
+    ones are appended in the order they were scraped.
+    '''
+    months = set(months)
+    merged = {team: [game for game in games if game["Date"][:7] not in months]
+              for team, games in existing.items()}
+    for team, games in new.items():
+        merged.setdefault(team, []).extend(games)
+    return merged
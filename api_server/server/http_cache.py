@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    '''
+    On-disk HTTP response cache keyed by URL. Each entry keeps the
+    response body next to a small metadata file with the ETag and
+    Last-Modified validators, so stale entries can be revalidated
+    with a conditional GET instead of downloaded again. Entries
+    marked immutable are served without touching the network.
+
+    The cache is bounded by max_bytes; when it grows past that the
+    least recently used entries are evicted, mutable ones first.
+    With offline=True callers should answer everything from the
+    cache and never go to the network.
+    '''
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024,
+                 offline: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key)
+        return base + ".body", base + ".json"
+
+    def _write_meta(self, meta_path: str, meta: dict) -> None:
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def get(self, url: str):
+        '''
+        Returns the cached entry for url as a dict with "body",
+        "etag", "last_modified", "immutable" and "fetched_at" keys,
+        or None on a miss.
+        '''
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "r", encoding="utf-8") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        meta["last_used"] = time.time()
+        self._write_meta(meta_path, meta)
+        return {**meta, "body": body}
+
+    def conditional_headers(self, entry) -> dict:
+        '''
+        Request headers that turn a GET into a conditional GET for a
+        cached entry.
+        '''
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, body: str, etag: str = None,
+            last_modified: str = None, immutable: bool = False) -> None:
+        body_path, meta_path = self._paths(url)
+        tmp_path = body_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp_path, body_path)
+        now = time.time()
+        self._write_meta(meta_path, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "immutable": immutable,
+            "fetched_at": now,
+            "last_used": now,
+            "size": os.path.getsize(body_path),
+        })
+        self.evict()
+
+    def revalidated(self, url: str, immutable: bool = False) -> None:
+        '''
+        Records a 304 for url: the cached body is still current, and
+        is pinned if the page has since become immutable.
+        '''
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta["fetched_at"] = time.time()
+        meta["immutable"] = meta.get("immutable", False) or immutable
+        self._write_meta(meta_path, meta)
+
+    def evict(self) -> None:
+        '''
+        Removes least recently used entries until the cache fits in
+        max_bytes. Immutable entries are only evicted once every
+        mutable entry is gone.
+        '''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta.get("immutable", False),
+                            meta.get("last_used", 0),
+                            meta.get("size", 0), meta["url"]))
+        total = sum(size for _, _, size, _ in entries)
+        for _, _, size, url in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(url):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            logger.info(f"Evicted cached response for {url}")
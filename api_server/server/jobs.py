@@ -0,0 +1,142 @@
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_current = threading.local()
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    '''
+    One background run of a refresh: its state (queued, running,
+    succeeded or failed), the stages it went through with their
+    timings, and its result or error.
+    '''
+
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stages = []
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def enter_stage(self, name: str) -> None:
+        now = time.time()
+        with self._lock:
+            if self.stages and self.stages[-1]["seconds"] is None:
+                self.stages[-1]["seconds"] = now - self.stages[-1]["started_at"]
+            self.stages.append({"name": name, "started_at": now, "seconds": None})
+
+    def _finish(self, state: str, result=None, error: str = None) -> None:
+        now = time.time()
+        with self._lock:
+            if self.stages and self.stages[-1]["seconds"] is None:
+                self.stages[-1]["seconds"] = now - self.stages[-1]["started_at"]
+            self.state, self.result, self.error = state, result, error
+            self.finished_at = now
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {"job_id": self.id,
+                    "kind": self.kind,
+                    "params": self.params,
+                    "state": self.state,
+                    "stage": self.stages[-1]["name"] if self.stages else None,
+                    "stages": [dict(stage) for stage in self.stages],
+                    "queued_seconds": (self.started_at or end) - self.submitted_at,
+                    "run_seconds": end - self.started_at if self.started_at else None,
+                    "result": self.result,
+                    "error": self.error}
+
+
+class JobRunner:
+    '''
+    Runs jobs on a bounded pool of max_workers threads, separate from
+    the threads serving requests, and keeps the last `history` jobs
+    for status queries. At most queue_limit jobs wait for a worker;
+    submitting more raises JobQueueFull. Submitting a job identical
+    (same kind and params) to one still queued or running returns
+    that job instead.
+
+    A job function reports its progress with job_stage(), which is a
+    no-op when the same code runs outside a job.
+    '''
+
+    def __init__(self, max_workers: int = 2, queue_limit: int = 8,
+                 history: int = 100):
+        self.queue_limit = queue_limit
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn, **params) -> Job:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.params == params and job.finished_at is None:
+                    return job
+            job = Job(kind, params)
+            queued = sum(1 for other in self._jobs.values() if other.state == "queued")
+            if queued >= self.queue_limit:
+                raise JobQueueFull(f"{queued} jobs are already waiting")
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.finished_at is not None]
+        for job_id in itertools.islice(finished, max(len(self._jobs) - self.history, 0)):
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, fn) -> None:
+        job.started_at = time.time()
+        job.state = "running"
+        _current.job = job
+        try:
+            result = fn(**job.params)
+        except Exception as e:
+            # HTTPException carries its message in detail
+            error = str(getattr(e, "detail", "") or e)
+            logger.warning(f"Job {job.kind} {job.id} failed: {error}")
+            job._finish("failed", error=error)
+        else:
+            job._finish("succeeded", result=result)
+        finally:
+            _current.job = None
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self) -> list:
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+
+def job_stage(name: str) -> None:
+    '''
+    Marks the start of the next stage of the job running on this
+    thread, if any.
+    '''
+    job = getattr(_current, "job", None)
+    if job is not None:
+        job.enter_stage(name)
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process in lease records
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaseHeld(Exception):
+    '''
+    Raised when another instance holds the lease; holder is its lease
+    record ({"owner", "acquired_at", "expires_at"}), if it could be read.
+    '''
+
+    def __init__(self, name: str, holder: dict = None):
+        message = f"{name} is held by another instance"
+        if holder is not None:
+            expires = time.strftime('%H:%M:%S', time.gmtime(holder['expires_at']))
+            message = f"{name} is held by {holder['owner']} until {expires} UTC"
+        super().__init__(message)
+        self.name = name
+        self.holder = holder
+
+
+class StorageLease:
+    '''
+    A lease on a piece of work shared by every instance using the same
+    storage backend, kept as the object leases/<name>.json. Acquiring
+    it is a compare-and-set on the object, so only one instance holds
+    it at a time; a lease that wasn't renewed for ttl_seconds (e.g.
+    its instance died) can be taken over. Every StorageLease object is
+    a holder of its own, also within one process.
+    '''
+
+    def __init__(self, store, name: str, ttl_seconds: float = 300):
+        self.store = store
+        self.name = name
+        self.object_name = f"leases/{name}.json"
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{INSTANCE_ID}-{uuid.uuid4().hex[:6]}"
+        self.version = None
+
+    def _record(self, acquired_at: float) -> bytes:
+        return json.dumps({"owner": self.owner,
+                           "acquired_at": acquired_at,
+                           "expires_at": time.time() + self.ttl_seconds}).encode("utf-8")
+
+    def holder(self):
+        data, _ = self.store.read_versioned(self.object_name)
+        return None if data is None else json.loads(data)
+
+    def acquire(self) -> bool:
+        '''
+        Takes the lease if it is free or expired.
+        '''
+        data, version = self.store.read_versioned(self.object_name)
+        if data is None:
+            self.version = self.store.create_if_absent(
+                self.object_name, self._record(time.time()), "application/json")
+            return self.version is not None
+        holder = json.loads(data)
+        if holder["expires_at"] > time.time():
+            return False
+        self.version = self.store.replace_if_version(
+            self.object_name, self._record(time.time()), "application/json", version)
+        return self.version is not None
+
+    def renew(self, acquired_at: float) -> bool:
+        '''
+        Extends the lease by ttl_seconds, if we still hold it.
+        '''
+        version = self.store.replace_if_version(
+            self.object_name, self._record(acquired_at), "application/json",
+            self.version)
+        if version is None:
+            logger.warning(f"Lost lease {self.name}")
+            return False
+        self.version = version
+        return True
+
+    def release(self) -> None:
+        if self.version is not None:
+            self.store.delete_if_version(self.object_name, self.version)
+            self.version = None
+
+    @contextmanager
+    def held(self):
+        '''
+        Holds the lease for the duration of the block, renewing it
+        every third of ttl_seconds. Raises LeaseHeld if another
+        instance holds it.
+        '''
+        if not self.acquire():
+            holder = self.holder()
+            # Try once more if it was released in the meantime
+            if holder is not None or not self.acquire():
+                raise LeaseHeld(self.name, holder)
+        acquired_at = time.time()
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(self.ttl_seconds / 3):
+                if not self.renew(acquired_at):
+                    return
+
+        renewer = threading.Thread(target=keep_alive, daemon=True,
+                                   name=f"lease-{self.name}")
+        renewer.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            renewer.join()
+            self.release()
@@ -0,0 +1,35 @@
+import datetime
+
+# Month a new NBA season starts counting in; games from then on
+# belong to the season ending the next year
+SEASON_START_MONTH = 10
+
+
+def season_start_year(day: datetime.date) -> int:
+    '''
+    Year the season a date belongs to started in: October 2024 to
+    September 2025 are the 2024-25 season. Over the summer this is the
+    season that just finished.
+    '''
+    return day.year if day.month >= SEASON_START_MONTH else day.year - 1
+
+
+def season_label(start_year: int) -> str:
+    '''
+    Name of the season starting in start_year, e.g. 2013 -> "2013-14".
+    '''
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
+
+def season_for_date(game_date: str) -> str:
+    '''
+    NBA season ("2013-14") that a YYYY-MM-DD game date belongs to.
+    '''
+    return season_label(season_start_year(datetime.date.fromisoformat(game_date[:10])))
+
+
+def current_season(today: datetime.date = None) -> str:
+    '''
+    The latest season that has started (or is about to).
+    '''
+    return season_label(season_start_year(today or datetime.date.today()))
@@ -0,0 +1,96 @@
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_json(obj) -> bytes:
+    '''
+    Encodes obj as compact UTF-8 json, with orjson when it is
+    installed (several times faster on the large game dicts) and the
+    standard library otherwise. Both write NaN and infinities as null,
+    as json has no such values, but the bytes aren't guaranteed to be
+    identical (float formatting can differ), so a published file's
+    ETag can change when orjson is installed or removed.
+    '''
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    try:
+        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False,
+                          allow_nan=False)
+    except ValueError:
+        # Only documents with non-finite floats pay for the copy
+        text = json.dumps(_finite_floats(obj), separators=(",", ":"),
+                          ensure_ascii=False, allow_nan=False)
+    return text.encode("utf-8")
+
+
+def _finite_floats(obj):
+    # obj with NaN and infinities replaced by None, as orjson writes them
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite_floats(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite_floats(value) for value in obj]
+    return obj
+
+
+def loads_json(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class EncodedJsonObject:
+    '''
+    A dict encoded once, member by member: the json document (written
+    out member by member for uploads, assembled only for a response
+    body) and the ndjson lines (one {"<key_name>": key, "<value_name>":
+    value} per member) are all built from the same encoded members
+    instead of serializing the dict again.
+    '''
+
+    def __init__(self, obj: dict):
+        self.members = [(dumps_json(key), dumps_json(value))
+                        for key, value in obj.items()]
+        self._document = None
+
+    def __len__(self):
+        return len(self.members)
+
+    def to_bytes(self) -> bytes:
+        if self._document is None:
+            self._document = b"{" + b",".join(key + b":" + value
+                                             for key, value in self.members) + b"}"
+        return self._document
+
+    def write_to(self, out) -> None:
+        '''
+        Writes the json document to the text file-like out member by
+        member, so an upload never holds it as one bytes object.
+        '''
+        out.write("{")
+        for i, (key, value) in enumerate(self.members):
+            out.write("," if i else "")
+            out.write(key.decode("utf-8"))
+            out.write(":")
+            out.write(value.decode("utf-8"))
+        out.write("}")
+
+    def iter_ndjson(self, key_name: str, value_name: str):
+        key_name, value_name = dumps_json(key_name), dumps_json(value_name)
+        for key, value in self.members:
+            yield b"{" + key_name + b":" + key + b"," + value_name + b":" + value + b"}\n"
+
+
+def iter_ndjson(obj: dict, key_name: str, value_name: str):
+    '''
+    Streams a dict as ndjson, encoding each member only when the
+    previous line was sent.
+    '''
+    key_name, value_name = dumps_json(key_name), dumps_json(value_name)
+    for key, value in obj.items():
+        yield (b"{" + key_name + b":" + dumps_json(key) + b"," + value_name
+               + b":" + dumps_json(value) + b"}\n")
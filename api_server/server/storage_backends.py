@@ -0,0 +1,487 @@
+import base64
+import datetime
+import fcntl
+import gzip
+import hashlib
+import io
+import logging
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from server.gcs_client import GZIP_MAGIC, download_blob_bytes, get_storage_client, gzip_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    '''
+    Where the pipeline publishes its artifacts and the dashboard reads
+    them from, addressed by object name (e.g. "game_logs/catalog.json").
+    Text artifacts are gzip-compressed on the way unless compression is
+    "none"; reads gunzip them again, so callers always get the
+    original bytes.
+
+    Writes whose content has the same MD5 as the stored object are
+    skipped, so an unchanged artifact keeps its generation; the object
+    is only marked as verified now (see read_fresh). read_bytes_cached
+    in turn only downloads an object again once its version changed.
+
+    read_versioned, create_if_absent, replace_if_version and
+    delete_if_version are atomic compare-and-set operations on small
+    objects such as leases; they store the bytes as given.
+
+    Backends implement _put_bytes, _put_file, _open_writer,
+    _mark_unchanged, stored_md5, version, read_bytes, read_fresh and
+    the compare-and-set operations.
+    '''
+
+    def __init__(self, compression: str = "gzip"):
+        self.compression = compression
+        self._read_cache = {}
+
+    def write_text(self, name: str, data, content_type: str) -> bool:
+        '''
+        Stores text (or bytes of UTF-8 text), compressed per the
+        backend's compression. Returns whether it was written.
+        '''
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self.compression == "gzip":
+            return self.write_bytes(name, gzip_bytes(data), content_type,
+                                    content_encoding="gzip")
+        return self.write_bytes(name, data, content_type)
+
+    def write_bytes(self, name: str, data: bytes, content_type: str,
+                    content_encoding: str = None) -> bool:
+        '''
+        Stores data as the object, unless it already holds exactly
+        that. Returns whether it was written.
+        '''
+        if self._unchanged(name, hashlib.md5(data).hexdigest()):
+            return False
+        self._put_bytes(name, data, content_type, content_encoding)
+        return True
+
+    def upload_file(self, path: str, name: str, content_type: str) -> bool:
+        '''
+        Stores a local file as the object, unless it already holds
+        exactly that. Returns whether it was written.
+        '''
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "md5").hexdigest()
+        if self._unchanged(name, digest):
+            return False
+        self._put_file(path, name, content_type)
+        return True
+
+    def _unchanged(self, name: str, md5_hex: str) -> bool:
+        if self.stored_md5(name) != md5_hex:
+            return False
+        self._mark_unchanged(name)
+        logger.info(f"{name} is unchanged, skipped writing it")
+        return True
+
+    @contextmanager
+    def open_text_writer(self, name: str, content_type: str):
+        '''
+        Opens a text stream that is written straight into the object,
+        so the data never has to be built in memory. If the block
+        raises, the write is cancelled and the existing object is left
+        untouched.
+        The content is hashed on the way; if it turns out to be what
+        the object already holds, the write is cancelled too.
+        '''
+        compress = self.compression == "gzip"
+        writer = self._open_writer(name, content_type,
+                                   content_encoding="gzip" if compress else None)
+        hashed = _HashingWriter(writer)
+        compressed = (gzip.GzipFile(fileobj=hashed, mode="wb", mtime=0)
+                      if compress else None)
+        text = io.TextIOWrapper(compressed or hashed, encoding="utf-8")
+        try:
+            yield text
+        except BaseException:
+            text.detach()
+            writer.terminate()
+            raise
+        # Closes the GzipFile and the hashing layer, not the writer
+        text.close()
+        if self._unchanged(name, hashed.md5.hexdigest()):
+            writer.terminate()
+        else:
+            writer.close()
+
+    def read_text(self, name: str):
+        data = self.read_bytes(name)
+        return None if data is None else data.decode("utf-8")
+
+    def read_bytes_cached(self, name: str):
+        '''
+        Like read_bytes, but keeps the content along with the object's
+        version and only downloads it again once the version changed,
+        so rereading an unchanged object costs a metadata lookup.
+        '''
+        version = self.version(name)
+        if version is None:
+            self._read_cache.pop(name, None)
+            return None
+        cached = self._read_cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = self.read_bytes(name)
+        if data is not None:
+            self._read_cache[name] = (version, data)
+        return data
+
+
+class GcsStorage(StorageBackend):
+    '''
+    Objects in a GCS bucket, accessed with the process-wide client of
+    the project and service account key. Streamed writes are resumable
+    uploads in chunks of chunk_size bytes (a multiple of 256 KB). An
+    object's version is its generation; an unchanged write patches its
+    verified_at metadata, which only bumps the metageneration.
+    '''
+
+    def __init__(self, project_id: str, service_account_key: str,
+                 bucket_name: str, compression: str = "gzip",
+                 chunk_size: int = None):
+        super().__init__(compression)
+        self.project_id = project_id
+        self.service_account_key = service_account_key
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+
+    def __repr__(self):
+        return f"GcsStorage(gs://{self.bucket_name})"
+
+    def _bucket(self):
+        client = get_storage_client(self.project_id, self.service_account_key)
+        return client.bucket(self.bucket_name)
+
+    def _put_bytes(self, name: str, data: bytes, content_type: str,
+                   content_encoding: str = None) -> None:
+        blob = self._bucket().blob(name)
+        blob.content_encoding = content_encoding
+        blob.upload_from_string(data, content_type=content_type)
+
+    def _open_writer(self, name: str, content_type: str,
+                     content_encoding: str = None):
+        blob = self._bucket().blob(name)
+        blob.content_encoding = content_encoding
+        return blob.open("wb", content_type=content_type,
+                         chunk_size=self.chunk_size)
+
+    def _put_file(self, path: str, name: str, content_type: str) -> None:
+        blob = self._bucket().blob(name, chunk_size=self.chunk_size)
+        blob.upload_from_filename(path, content_type=content_type)
+
+    def _mark_unchanged(self, name: str) -> None:
+        blob = self._bucket().blob(name)
+        blob.metadata = {"verified_at":
+                         datetime.datetime.now(datetime.timezone.utc).isoformat()}
+        blob.patch()
+
+    def stored_md5(self, name: str):
+        '''
+        Hex MD5 of the object's stored bytes, None if it doesn't exist.
+        '''
+        blob = self._bucket().get_blob(name)
+        if blob is None or blob.md5_hash is None:
+            return None
+        return base64.b64decode(blob.md5_hash).hex()
+
+    def version(self, name: str):
+        blob = self._bucket().get_blob(name)
+        return None if blob is None else blob.generation
+
+    def read_bytes(self, name: str):
+        '''
+        The object's content, or None if it doesn't exist.
+        '''
+        try:
+            return download_blob_bytes(self._bucket().blob(name))
+        except NotFound:
+            return None
+
+    def read_fresh(self, name: str, max_age_seconds: float) -> tuple:
+        '''
+        (content, updated) if the object was updated, or verified
+        unchanged, less than max_age_seconds ago, otherwise (None, None).
+        '''
+        blob = self._bucket().get_blob(name)
+        if blob is None:
+            return None, None
+        updated = blob.updated
+        verified_at = (blob.metadata or {}).get("verified_at")
+        if verified_at is not None:
+            updated = max(updated, datetime.datetime.fromisoformat(verified_at))
+        if not is_fresh(updated, max_age_seconds):
+            return None, None
+        try:
+            return download_blob_bytes(blob), updated
+        except NotFound:
+            return None, None
+
+    def read_versioned(self, name: str) -> tuple:
+        '''
+        (content, generation), or (None, None) if the object doesn't
+        exist (or changed while it was read).
+        '''
+        blob = self._bucket().get_blob(name)
+        if blob is None:
+            return None, None
+        try:
+            return (blob.download_as_bytes(if_generation_match=blob.generation),
+                    blob.generation)
+        except (NotFound, PreconditionFailed):
+            return None, None
+
+    def create_if_absent(self, name: str, data: bytes, content_type: str):
+        '''
+        Creates the object unless it exists. Returns its generation,
+        or None if it already existed.
+        '''
+        blob = self._bucket().blob(name)
+        try:
+            blob.upload_from_string(data, content_type=content_type,
+                                    if_generation_match=0)
+        except PreconditionFailed:
+            return None
+        return blob.generation
+
+    def replace_if_version(self, name: str, data: bytes, content_type: str,
+                           version):
+        '''
+        Replaces the object if it is still at generation version.
+        Returns the new generation, or None if it had changed.
+        '''
+        blob = self._bucket().blob(name)
+        try:
+            blob.upload_from_string(data, content_type=content_type,
+                                    if_generation_match=version)
+        except (NotFound, PreconditionFailed):
+            return None
+        return blob.generation
+
+    def delete_if_version(self, name: str, version) -> bool:
+        try:
+            self._bucket().blob(name).delete(if_generation_match=version)
+        except (NotFound, PreconditionFailed):
+            return False
+        return True
+
+
+class LocalStorage(StorageBackend):
+    '''
+    Objects as files under root_dir, with the object name as relative
+    path, stored byte for byte as they would be in the bucket. A stand-in
+    for GCS to run and benchmark the pipeline offline. A file's
+    modification time is its update time and, with its inode and size,
+    its version; an unchanged write only touches the file. The
+    compare-and-set operations hold an flock on name.lock, so they are
+    atomic across processes sharing root_dir.
+    '''
+
+    def __init__(self, root_dir: str, compression: str = "gzip"):
+        super().__init__(compression)
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f"LocalStorage({self.root_dir})"
+
+    def path(self, name: str) -> str:
+        path = os.path.join(self.root_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _put_bytes(self, name: str, data: bytes, content_type: str,
+                   content_encoding: str = None) -> None:
+        path = self.path(name)
+        tmp_path = _temp_path(path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _open_writer(self, name: str, content_type: str,
+                     content_encoding: str = None):
+        return _LocalObjectWriter(self.path(name))
+
+    def _put_file(self, path: str, name: str, content_type: str) -> None:
+        target = self.path(name)
+        tmp_path = _temp_path(target)
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+
+    def _mark_unchanged(self, name: str) -> None:
+        os.utime(os.path.join(self.root_dir, name))
+
+    def stored_md5(self, name: str):
+        '''
+        Hex MD5 of the object's stored bytes, None if it doesn't exist.
+        '''
+        try:
+            with open(os.path.join(self.root_dir, name), "rb") as f:
+                return hashlib.file_digest(f, "md5").hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def version(self, name: str):
+        try:
+            stat = os.stat(os.path.join(self.root_dir, name))
+        except FileNotFoundError:
+            return None
+        # Every write replaces the file, so a new inode; the old one
+        # is still in use then and can't be handed out again
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def read_bytes(self, name: str):
+        '''
+        The object's content, or None if it doesn't exist.
+        '''
+        try:
+            with open(os.path.join(self.root_dir, name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if data[:2] == GZIP_MAGIC:
+            data = gzip.decompress(data)
+        return data
+
+    def read_fresh(self, name: str, max_age_seconds: float) -> tuple:
+        '''
+        (content, updated) if the object was updated less than
+        max_age_seconds ago, otherwise (None, None).
+        '''
+        try:
+            updated = datetime.datetime.fromtimestamp(
+                os.path.getmtime(os.path.join(self.root_dir, name)),
+                datetime.timezone.utc)
+        except OSError:
+            return None, None
+        if not is_fresh(updated, max_age_seconds):
+            return None, None
+        data = self.read_bytes(name)
+        return (None, None) if data is None else (data, updated)
+
+    @contextmanager
+    def _locked(self, name: str):
+        with open(self.path(name) + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def read_versioned(self, name: str) -> tuple:
+        '''
+        (content, version), or (None, None) if the object doesn't exist.
+        '''
+        with self._locked(name):
+            version = self.version(name)
+            if version is None:
+                return None, None
+            with open(os.path.join(self.root_dir, name), "rb") as f:
+                return f.read(), version
+
+    def create_if_absent(self, name: str, data: bytes, content_type: str):
+        '''
+        Creates the object unless it exists. Returns its version, or
+        None if it already existed.
+        '''
+        with self._locked(name):
+            if self.version(name) is not None:
+                return None
+            self._put_bytes(name, data, content_type)
+            return self.version(name)
+
+    def replace_if_version(self, name: str, data: bytes, content_type: str,
+                           version):
+        '''
+        Replaces the object if it is still at version. Returns the new
+        version, or None if it had changed.
+        '''
+        with self._locked(name):
+            if self.version(name) != version:
+                return None
+            self._put_bytes(name, data, content_type)
+            return self.version(name)
+
+    def delete_if_version(self, name: str, version) -> bool:
+        with self._locked(name):
+            if self.version(name) != version:
+                return False
+            os.remove(os.path.join(self.root_dir, name))
+            return True
+
+
+class _LocalObjectWriter(io.BufferedWriter):
+    # Writes to a temporary file next to path and moves it into place
+    # on close, like a resumable upload only replacing the object once
+    # finalized.
+
+    def __init__(self, path: str):
+        self.target = path
+        self.tmp_path = _temp_path(path)
+        super().__init__(io.FileIO(self.tmp_path, "wb"))
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            os.replace(self.tmp_path, self.target)
+
+    def terminate(self):
+        if not self.closed:
+            io.BufferedWriter.close(self)
+            os.remove(self.tmp_path)
+
+
+def _temp_path(path: str) -> str:
+    # One per write, so concurrent writes of an object don't share it
+    return f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+class _HashingWriter(io.BufferedIOBase):
+    # Passes writes through to a storage writer, hashing the bytes;
+    # closing it leaves the storage writer open.
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+        self.md5 = hashlib.md5()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.md5.update(data)
+        self.writer.write(data)
+        return len(data)
+
+
+def is_fresh(published_at: datetime.datetime, max_age_seconds: float) -> bool:
+    '''
+    Whether an artifact published at the (timezone aware) time is
+    younger than max_age_seconds.
+    '''
+    age = datetime.datetime.now(datetime.timezone.utc) - published_at
+    return age.total_seconds() <= max_age_seconds
+
+
+def make_storage_backend(kind: str, project_id: str = None,
+                         service_account_key: str = None,
+                         bucket_name: str = None, local_dir: str = None,
+                         compression: str = "gzip",
+                         chunk_size: int = None) -> StorageBackend:
+    '''
+    The backend selected by STORAGE_BACKEND: "gcs" for the bucket,
+    "local" for a directory standing in for it.
+    '''
+    if kind == "gcs":
+        return GcsStorage(project_id, service_account_key, bucket_name,
+                          compression=compression, chunk_size=chunk_size)
+    if kind == "local":
+        return LocalStorage(local_dir, compression=compression)
+    raise ValueError(f"Unknown storage backend {kind!r}, expected gcs or local")
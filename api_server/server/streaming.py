@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+from server.serialization import dumps_json
+
+
+def stream_team_json(team_dicts, out) -> int:
+    '''
+    Writes {team: [game, ...], ...} json to the text file-like out
+    from an iterable of partial team dictionaries (e.g. one per
+    scraped month), producing exactly what dumps_json would for the
+    merged dictionary. Games are spooled to one temporary file per
+    team while the input is consumed, so memory stays flat however
+    many seasons are streamed through. Returns the number of teams.
+    '''
+    with tempfile.TemporaryDirectory() as spool_dir:
+        spools = {}
+        try:
+            for team_dict in team_dicts:
+                for team, games in team_dict.items():
+                    if team not in spools:
+                        path = os.path.join(spool_dir, f"{len(spools)}.jsonl")
+                        spools[team] = open(path, "w+", encoding="utf-8")
+                    spool = spools[team]
+                    for game in games:
+                        spool.write(dumps_json(game).decode("utf-8"))
+                        spool.write("\n")
+
+            out.write("{")
+            for i, (team, spool) in enumerate(spools.items()):
+                out.write("," if i else "")
+                out.write(dumps_json(team).decode("utf-8"))
+                out.write(":[")
+                spool.seek(0)
+                for j, line in enumerate(spool):
+                    out.write("," if j else "")
+                    out.write(line.rstrip("\n"))
+                out.write("]")
+            out.write("}")
+        finally:
+            for spool in spools.values():
+                spool.close()
+    return len(spools)
+
+
+class CsvStreamWriter:
+    '''
+    Appends DataFrames to a text file-like as one csv, writing the
+    header with the first non-empty frame only.
+    '''
+
+    def __init__(self, out):
+        self.out = out
+        self.rows = 0
+
+    def write(self, df) -> None:
+        if df is None or df.empty:
+            return
+        df.to_csv(self.out, header=self.rows == 0, index=False)
+        self.rows += len(df)
@@ -0,0 +1,30 @@
+import json
+
+from server import get_game_id_api_mod
+from server.game_id_index import GameIdIndex
+
+
+def test_only_seasons_missing_from_the_index_are_fetched(monkeypatch):
+    fetched = []
+
+    def get_league_games_lookup(season):
+        fetched.append(season)
+        return {1610612737: {"2024-11-04": "0022400123"}}
+
+    monkeypatch.setattr(get_game_id_api_mod, "get_league_games_lookup",
+                        get_league_games_lookup)
+    monkeypatch.setattr(get_game_id_api_mod.time, "sleep", lambda seconds: None)
+    attendance = json.dumps({"Atlanta Hawks": [{"Date": "2024-11-04"},
+                                               {"Date": "2024-11-06"}]})
+    index = GameIdIndex()
+
+    games = get_game_id_api_mod.get_game_id_from_json(
+        attendance, get_game_id_api_mod.name_to_id, index)
+    assert fetched == ["2024-25"]
+    assert games["Atlanta Hawks"] == [{"Date": "2024-11-04", "GameID": "0022400123"},
+                                      {"Date": "2024-11-06"}]
+
+    # The season was fetched after it ended, so it isn't fetched again
+    get_game_id_api_mod.get_game_id_from_json(
+        attendance, get_game_id_api_mod.name_to_id, index)
+    assert fetched == ["2024-25"]
@@ -0,0 +1,57 @@
+from server.get_nba_attendance_v2 import (clean_nba_attendance_data,
+                                          create_nba_team_dictionary,
+                                          merge_team_dictionaries,
+                                          parse_schedule_table,
+                                          schedule_months)
+
+
+def schedule_page(rows):
+    cells = "".join(
+        "<tr>"
+        f'<th data-stat="date_game">{date}</th>'
+        f'<td data-stat="visitor_team_name">{visitor}</td>'
+        f'<td data-stat="visitor_pts">{visitor_pts}</td>'
+        f'<td data-stat="home_team_name">{home}</td>'
+        f'<td data-stat="home_pts">{home_pts}</td>'
+        f'<td data-stat="attendance">{attendance}</td>'
+        "</tr>"
+        for date, visitor, visitor_pts, home, home_pts, attendance in rows)
+    return f'<html><body><table id="schedule"><tbody>{cells}</tbody></table></body></html>'
+
+
+# The season in progress lists games that haven't been played yet
+# without scores or attendance.
+PAGE = schedule_page([
+    ("Tue, Nov 4, 2025", "Boston Celtics", "101", "Atlanta Hawks", "110", "17,044"),
+    ("Wed, Nov 5, 2025", "Atlanta Hawks", "120", "Boston Celtics", "99", "19,156"),
+    ("Sat, Nov 29, 2025", "Boston Celtics", "", "Atlanta Hawks", "", ""),
+])
+
+
+def test_unplayed_games_are_left_out():
+    team_dict = create_nba_team_dictionary(
+        clean_nba_attendance_data(parse_schedule_table(PAGE)))
+    assert team_dict == {
+        "Atlanta Hawks": [{"Date": "2025-11-04", "Attendance": 17044,
+                           "Points": 110, "HomeWin": True}],
+        "Boston Celtics": [{"Date": "2025-11-05", "Attendance": 19156,
+                            "Points": 99, "HomeWin": False}],
+    }
+
+
+def test_merge_replaces_the_rescraped_months():
+    df = parse_schedule_table(PAGE)
+    existing = {
+        "Atlanta Hawks": [
+            {"Date": "2025-10-25", "Attendance": 16500, "Points": 104, "HomeWin": True},
+            # postponed, it is no longer on the November page
+            {"Date": "2025-11-02", "Attendance": None, "Points": None, "HomeWin": False},
+        ],
+        "Boston Celtics": [],
+    }
+    merged = merge_team_dictionaries(
+        existing, create_nba_team_dictionary(clean_nba_attendance_data(df)),
+        schedule_months(df))
+    assert schedule_months(df) == ["2025-11"]
+    assert [game["Date"] for game in merged["Atlanta Hawks"]] == ["2025-10-25", "2025-11-04"]
+    assert [game["Date"] for game in merged["Boston Celtics"]] == ["2025-11-05"]
@@ -0,0 +1,15 @@
+import datetime
+
+from server.game_log_partitions import current_season
+from server.get_nba_attendance_v2 import latest_season
+from server.seasons import season_for_date, season_start_year
+
+
+def test_a_season_starts_counting_in_october():
+    assert season_start_year(datetime.date(2025, 9, 30)) == 2024
+    assert season_start_year(datetime.date(2025, 10, 1)) == 2025
+    # The 2020-21 Finals were played in July 2021
+    assert season_for_date("2021-07-20") == "2020-21"
+    for day in (datetime.date(2025, 9, 30), datetime.date(2025, 10, 1)):
+        assert current_season(day) == season_for_date(day.isoformat())
+        assert latest_season(day) == int(current_season(day)[:4]) + 1
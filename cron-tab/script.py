@@ -1,11 +1,14 @@
 import requests
 
 API_BASE = "http://api-server:8000"
+# crontab=true refreshes the data; a plain GET only downloads the
+# published file. The nightly attendance refresh is incremental: it
+# re-scrapes the current season's months into the published file.
 ENDPOINTS = [
-    "/retrieve_nba_attendance_data_as_json_file",
-    "/retrieve_seatgeek_api_data_as_json_file",
-    "/retrieve_nba_game_ids_as_json_file",
-    "/retrieve_all_nba_game_data_as_json_file",
+    "/retrieve_nba_attendance_data_as_json_file?crontab=true&incremental=true",
+    "/retrieve_seatgeek_api_data_as_json_file?crontab=true",
+    "/retrieve_nba_game_ids_as_json_file?crontab=true",
+    "/retrieve_all_nba_game_data_as_csv?crontab=true",
 ]
 
 def run_cron_jobs():
@@ -0,0 +1,144 @@
+"""
+Memory and time of building the home/away game log tables with
+build_game_log_tables against the old per-team/season builder, on
+synthetic raw TeamGameLogs frames (30 teams x 82 games per season),
+checking that both produce the same csv up to float32 precision.
+
+    python dev_scripts/benchmark_game_log_tables.py --seasons 11 30
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api_server"))
+
+from server.get_game_data import build_game_log_tables
+
+RANK_COLUMNS = [f"{stat}_RANK" for stat in
+                ["GP", "W", "L", "W_PCT", "MIN", "FGM", "FGA", "FG_PCT", "FG3M",
+                 "FG3A", "FG3_PCT", "FTM", "FTA", "FT_PCT", "OREB", "DREB", "REB",
+                 "AST", "TOV", "STL", "BLK", "BLKA", "PF", "PFD", "PTS",
+                 "PLUS_MINUS"]]
+
+
+def split_team_game_logs_legacy(df):
+    # The per-team/season builder build_game_log_tables replaced.
+    df['SEASON_WINRATE'] = round((df['WL']=='W').mean(), 3)
+    df['WIN'] = (df['WL']=='W').astype('int64')
+    df['HOME'] = df['MATCHUP'].str.contains('vs.', na=False)
+    df["OPP"] = df["MATCHUP"].str[-3:]
+    df['EFGP'] = (df['FGM'] + 0.5 * df['FG3M']) / df['FGA']
+    df['TOVP'] = df['TOV'] / (df['FGA'] + 0.44 * df['FTA'] + df['TOV'])
+    df['FTR'] = df['FTA'] / df['FGA']
+    home = df[df['HOME']].copy()
+    home['HOME_WINRATE'] = round(home['WIN'].mean(), 3)
+    away = df[~df['HOME']].copy()
+    away['AWAY_WINRATE'] = round(away['WIN'].mean(), 3)
+    return home, away
+
+
+def build_game_log_tables_legacy(team_season_dfs):
+    home_df_list, away_df_list = [], []
+    for df in team_season_dfs:
+        home_df, away_df = split_team_game_logs_legacy(df)
+        home_df_list.append(home_df)
+        away_df_list.append(away_df)
+    return (pd.concat(home_df_list, ignore_index=True),
+            pd.concat(away_df_list, ignore_index=True))
+
+
+def synthetic_team_season(team, season, rng, games=82):
+    abbreviations = [f"T{i:02d}" for i in range(30)]
+    opponents = rng.choice([a for a in abbreviations if a != abbreviations[team]], games)
+    home = rng.random(games) < 0.5
+    fga = rng.integers(70, 100, games)
+    fgm = (fga * rng.uniform(0.38, 0.52, games)).astype(np.int64)
+    fg3a = rng.integers(15, 45, games)
+    fg3m = (fg3a * rng.uniform(0.25, 0.42, games)).astype(np.int64)
+    fta = rng.integers(10, 35, games)
+    ftm = (fta * rng.uniform(0.6, 0.9, games)).astype(np.int64)
+    df = pd.DataFrame({
+        "SEASON_YEAR": f"{season}-{(season + 1) % 100:02d}",
+        "TEAM_ID": 1610612737 + team,
+        "TEAM_ABBREVIATION": abbreviations[team],
+        "TEAM_NAME": f"Team {team}",
+        "GAME_ID": [f"002{season % 100:02d}{team:02d}{g:03d}" for g in range(games)],
+        "GAME_DATE": (pd.Timestamp(f"{season}-10-25")
+                      + pd.to_timedelta(np.sort(rng.integers(0, 170, games)), unit="D")
+                      ).strftime("%Y-%m-%dT00:00:00"),
+        "MATCHUP": [f"{abbreviations[team]} vs. {o}" if h else f"{abbreviations[team]} @ {o}"
+                    for h, o in zip(home, opponents)],
+        "WL": rng.choice(["W", "L"], games),
+        "MIN": 240.0,
+        "FGM": fgm, "FGA": fga, "FG_PCT": np.round(fgm / fga, 3),
+        "FG3M": fg3m, "FG3A": fg3a, "FG3_PCT": np.round(fg3m / fg3a, 3),
+        "FTM": ftm, "FTA": fta, "FT_PCT": np.round(ftm / fta, 3),
+        "OREB": rng.integers(5, 20, games), "DREB": rng.integers(25, 45, games),
+        "REB": rng.integers(30, 60, games), "AST": rng.integers(15, 35, games),
+        "TOV": rng.integers(8, 22, games), "STL": rng.integers(3, 14, games),
+        "BLK": rng.integers(1, 10, games), "BLKA": rng.integers(1, 10, games),
+        "PF": rng.integers(12, 28, games), "PFD": rng.integers(12, 28, games),
+        "PTS": rng.integers(85, 135, games),
+        "PLUS_MINUS": rng.integers(-30, 30, games).astype("float64"),
+    })
+    for column in RANK_COLUMNS:
+        df[column] = rng.integers(1, 2400, games)
+    return df
+
+
+def synthetic_game_logs(seasons, seed=0):
+    rng = np.random.default_rng(seed)
+    return [synthetic_team_season(team, 2024 - seasons + i, rng)
+            for team in range(30) for i in range(seasons)]
+
+
+def table_mb(home, away):
+    return (home.memory_usage(deep=True).sum()
+            + away.memory_usage(deep=True).sum()) / 2**20
+
+
+def same_csv(legacy, compact):
+    # float32 columns print fewer digits, so compare the parsed values.
+    legacy = pd.read_csv(io.StringIO(legacy.to_csv(index=False)))
+    compact = pd.read_csv(io.StringIO(compact.to_csv(index=False)))
+    if list(legacy.columns) != list(compact.columns):
+        return False
+    for column in legacy.columns:
+        if pd.api.types.is_float_dtype(legacy[column]):
+            if not np.allclose(legacy[column], compact[column], rtol=1e-6,
+                               equal_nan=True):
+                return False
+        elif not legacy[column].equals(compact[column]):
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--seasons", type=int, nargs="+", default=[11, 30])
+    args = arg_parser.parse_args()
+
+    print(f"{'seasons':>7} {'games':>7} {'legacy MB':>10} {'compact MB':>11} "
+          f"{'ratio':>6} {'legacy s':>9} {'compact s':>10} {'same':>5}")
+    for seasons in args.seasons:
+        frames = synthetic_game_logs(seasons)
+        games = sum(len(df) for df in frames)
+
+        start = time.perf_counter()
+        legacy = build_game_log_tables_legacy([df.copy() for df in frames])
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compact = build_game_log_tables([df.copy() for df in frames])
+        compact_s = time.perf_counter() - start
+
+        legacy_mb, compact_mb = table_mb(*legacy), table_mb(*compact)
+        same = same_csv(legacy[0], compact[0]) and same_csv(legacy[1], compact[1])
+        print(f"{seasons:>7} {games:>7} {legacy_mb:>10.1f} {compact_mb:>11.1f} "
+              f"{legacy_mb / compact_mb:>5.1f}x {legacy_s:>9.2f} {compact_s:>10.2f} "
+              f"{str(same):>5}")
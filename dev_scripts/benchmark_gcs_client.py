@@ -0,0 +1,70 @@
+"""
+Setup cost of building service-account credentials and a storage
+client for every GCS call, as save_to_gcs and retrieve_data_from_gcs
+used to, against reusing the cached client from get_storage_client.
+No network access is needed: without --key a throwaway service
+account key is generated.
+
+    python dev_scripts/benchmark_gcs_client.py --calls 100
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.oauth2 import service_account
+from google.cloud import storage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api_server"))
+
+from server.gcs_client import get_storage_client, storage_client_stats
+
+
+def throwaway_key(path):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(serialization.Encoding.PEM,
+                                    serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption()).decode()
+    with open(path, "w") as f:
+        json.dump({"type": "service_account", "project_id": "benchmark",
+                   "private_key_id": "0", "private_key": pem,
+                   "client_email": "benchmark@benchmark.iam.gserviceaccount.com",
+                   "client_id": "0", "token_uri": "https://oauth2.googleapis.com/token"},
+                  f)
+
+
+def uncached_client(project_id, key):
+    # What every call did before get_storage_client.
+    credentials = service_account.Credentials.from_service_account_file(key)
+    return storage.Client(project=project_id, credentials=credentials)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--calls", type=int, default=100)
+    arg_parser.add_argument("--key", help="service account key file")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        key = args.key or os.path.join(tmp, "key.json")
+        if not args.key:
+            throwaway_key(key)
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            uncached_client("benchmark", key)
+        uncached_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            get_storage_client("benchmark", key)
+        cached_s = time.perf_counter() - start
+
+    print(f"{'calls':>6} {'per-call setup ms':>18} {'cached ms/call':>15}")
+    print(f"{args.calls:>6} {1000 * uncached_s / args.calls:>18.2f} "
+          f"{1000 * cached_s / args.calls:>15.3f}")
+    print(storage_client_stats())
@@ -0,0 +1,120 @@
+"""
+End-to-end throughput of the game data path on a laptop: refresh the
+game log partitions, publish the csv, parquet and game fact artifacts,
+then load them the way the dashboard does, all against the local
+storage backend (STORAGE_BACKEND=local) in a temporary directory.
+stats.nba.com is replaced by synthetic game logs (30 teams x 82 games
+per season), so the timings are the pipeline's own cost.
+
+Needs the packages of both the API server and the Streamlit app.
+
+    python dev_scripts/benchmark_pipeline.py --seasons 11 --runs 2
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+here = os.path.dirname(__file__)
+sys.path.insert(0, os.path.join(here, "..", "api_server"))
+sys.path.insert(0, os.path.join(here, "..", "streamlit"))
+
+from benchmark_game_log_tables import synthetic_team_season
+
+
+def configure(work_dir, seasons):
+    # Everything the pipeline persists goes under work_dir; set before
+    # the modules read their configuration on import.
+    from server.game_log_partitions import current_season
+    last = int(current_season()[:4])
+    os.environ.update({
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_DIR": os.path.join(work_dir, "bucket"),
+        "GAME_LOG_PARTITION_DIR": os.path.join(work_dir, "game_logs"),
+        "GAME_LOG_FIRST_SEASON": f"{last - seasons + 1}-{(last - seasons + 2) % 100:02d}",
+        "CHECKPOINT_DIR": os.path.join(work_dir, "checkpoints"),
+        "ARTIFACT_CACHE_DIR": os.path.join(work_dir, "artifacts"),
+        "GAME_ID_INDEX_PATH": os.path.join(work_dir, "game_id_index.json"),
+        "HTTP_CACHE_DIR": os.path.join(work_dir, "http"),
+    })
+
+
+def synthetic_fetch(team_ids):
+    def fetch_team_game_logs(team_id, season, season_type="Regular Season"):
+        rng = np.random.default_rng([team_id, int(season[:4])])
+        df = synthetic_team_season(team_ids.index(team_id) % 30, int(season[:4]), rng)
+        df["TEAM_ID"] = team_id
+        return df
+    return fetch_team_game_logs
+
+
+def synthetic_game_ids(home_df):
+    rng = np.random.default_rng(0)
+    games = [{"Date": date[:10], "Attendance": int(attendance), "Points": 100,
+              "HomeWin": bool(win), "GameID": game_id}
+             for date, attendance, win, game_id in
+             zip(home_df["GAME_DATE"], rng.integers(12000, 21000, len(home_df)),
+                 home_df["WIN"], home_df["GAME_ID"])]
+    return {"All": games}
+
+
+def bucket_mb(root):
+    return sum(os.path.getsize(os.path.join(path, name))
+               for path, _, names in os.walk(root) for name in names) / 2**20
+
+
+def timed(label, results, fn):
+    start = time.perf_counter()
+    value = fn()
+    results.append((label, time.perf_counter() - start))
+    return value
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--seasons", type=int, default=11)
+    arg_parser.add_argument("--runs", type=int, default=2,
+                            help="the first run fetches every partition, "
+                                 "later ones only the current season")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        configure(work_dir, args.seasons)
+        import main
+        import server.get_game_data as get_game_data
+        import interactive_app
+
+        team_ids = list(dict.fromkeys(main.name_to_id.values()))
+        get_game_data.fetch_team_game_logs = synthetic_fetch(team_ids)
+        main.nba_api_interval = main.nba_api_min_interval = 0.0
+
+        print(f"{args.seasons} seasons, {main.store!r}")
+        for run in range(args.runs):
+            results = []
+            timed("refresh + publish csv", results, main.get_nba_game_data_csv)
+            timed("refresh + publish parquet", results, main.get_nba_game_data_parquet)
+            if run == 0:
+                # The game facts need a get_game_ids.json to join
+                partitions = main.load_game_log_partitions()
+                home_df, _ = get_game_data.build_game_log_tables(
+                    get_game_data.iter_partitioned_game_logs(
+                        partitions, partitions.seasons(), team_ids))
+                main.store.write_text("get_game_ids.json",
+                                      json.dumps(synthetic_game_ids(home_df)),
+                                      "application/json")
+            timed("refresh + publish game facts", results, main.get_game_facts_parquet)
+            home, away = timed("dashboard: game tables", results,
+                               lambda: interactive_app.retrieve_game_data_from_gcs(main.store))
+            facts = timed("dashboard: game facts", results,
+                          lambda: interactive_app.retrieve_game_facts_from_gcs(main.store))
+
+            print(f"\nrun {run + 1}: {len(home)} home / {len(away)} away games, "
+                  f"{len(facts)} fact rows, bucket "
+                  f"{bucket_mb(main.store.root_dir):.1f} MB")
+            for label, seconds in results:
+                print(f"  {label:<30} {seconds:>7.2f} s")
+            print(f"  {'total':<30} {sum(s for _, s in results):>7.2f} s")
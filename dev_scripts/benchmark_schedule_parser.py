@@ -0,0 +1,79 @@
+"""
+Benchmarks parse_schedule_table against the old pd.read_html path on
+recorded basketball-reference schedule pages.
+
+Pages are read from a directory of saved .html files or from the
+scraper's response cache (.body files), e.g.
+
+    python dev_scripts/benchmark_schedule_parser.py .cache/http
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api_server"))
+
+from server.get_nba_attendance_v2 import (clean_nba_attendance_data,
+                                          create_nba_team_dictionary,
+                                          parse_schedule_table,
+                                          read_html_schedule_table)
+
+
+def load_pages(page_dir):
+    pages = []
+    for name in sorted(os.listdir(page_dir)):
+        if name.endswith((".html", ".body")):
+            with open(os.path.join(page_dir, name), "r", encoding="utf-8") as f:
+                pages.append((name, f.read()))
+    return pages
+
+
+def time_parser(parser, pages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html in pages:
+            parser(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def team_dictionary(parser, html):
+    try:
+        df = clean_nba_attendance_data(parser(html))
+    except KeyError as e:
+        # read_html picked a table that isn't the schedule
+        return f"missing column {e}"
+    return json.dumps(create_nba_team_dictionary(df))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("page_dir")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    pages = load_pages(args.page_dir)
+    if not pages:
+        sys.exit(f"No .html or .body files in {args.page_dir}")
+    total_mb = sum(len(html) for _, html in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB")
+
+    read_html_s = time_parser(read_html_schedule_table, pages, args.repeat)
+    targeted_s = time_parser(parse_schedule_table, pages, args.repeat)
+    print(f"pd.read_html:         {read_html_s:8.3f}s "
+          f"({1000 * read_html_s / len(pages):.1f} ms/page)")
+    print(f"parse_schedule_table: {targeted_s:8.3f}s "
+          f"({1000 * targeted_s / len(pages):.1f} ms/page)")
+    print(f"speedup: {read_html_s / targeted_s:.1f}x")
+
+    # Pages with a "Playoffs" separator row differ on purpose: read_html
+    # turns their points columns into strings, which breaks Home_Win.
+    mismatched = [name for name, html in pages
+                  if team_dictionary(read_html_schedule_table, html)
+                  != team_dictionary(parse_schedule_table, html)]
+    print(f"pages whose team dictionary differs: {len(mismatched)}")
+    for name in mismatched:
+        print(f"  {name}")
@@ -0,0 +1,96 @@
+"""
+Microbenchmark of create_nba_team_dictionary against the old
+iterrows() builder on synthetic cleaned attendance data, checking that
+both produce byte-identical json.
+
+    python dev_scripts/benchmark_team_dictionary.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api_server"))
+
+from server.get_nba_attendance_v2 import create_nba_team_dictionary
+
+
+def create_nba_team_dictionary_iterrows(nba_attendance_clean_df):
+    # The builder create_nba_team_dictionary replaced.
+    nba_team_dict = {}
+    for _, row in nba_attendance_clean_df.iterrows():
+        team = row["Home/Neutral"]
+        if team not in nba_team_dict:
+            nba_team_dict[team] = []
+        attendance = row["Attend."]
+        attendance = int(attendance) if pd.notna(attendance) else None
+        points = row["PTS.1"]
+        points = int(points) if pd.notna(points) else None
+        home_win = row["Home_Win"]
+        home_win = bool(home_win) if pd.notna(home_win) else None
+        nba_team_dict[team].append({
+            "Date": row["Date"].strftime("%Y-%m-%d"),
+            "Attendance": attendance,
+            "Points": points,
+            "HomeWin": home_win
+        })
+    return nba_team_dict
+
+
+def synthetic_games(n, seed=0):
+    rng = np.random.default_rng(seed)
+    attendance = rng.integers(10000, 21000, n).astype("float64")
+    attendance[rng.random(n) < 0.02] = np.nan
+    home_pts = rng.integers(80, 140, n).astype("float64")
+    home_pts[rng.random(n) < 0.01] = np.nan
+    visitor_pts = rng.integers(80, 140, n).astype("float64")
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2013-10-29")
+                + pd.to_timedelta(rng.integers(0, 4000, n), unit="D"),
+        "Visitor/Neutral": rng.choice([f"Team {i}" for i in range(30)], n),
+        "PTS": visitor_pts,
+        "Home/Neutral": rng.choice([f"Team {i}" for i in range(30)], n),
+        "PTS.1": home_pts,
+        "Attend.": attendance,
+        "Home_Win": home_pts > visitor_pts,
+    })
+
+
+def best_time(builder, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = builder(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", type=int, nargs="+",
+                            default=[10_000, 100_000, 1_000_000])
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--iterrows-max", type=int, default=1_000_000,
+                            help="skip the iterrows builder above this size")
+    args = arg_parser.parse_args()
+
+    print(f"{'games':>9} {'iterrows us/row':>16} {'columnar us/row':>16} "
+          f"{'speedup':>8} {'identical':>9}")
+    for n in args.sizes:
+        df = synthetic_games(n)
+        columnar_s, columnar = best_time(create_nba_team_dictionary, df,
+                                         args.repeat)
+        if n <= args.iterrows_max:
+            iterrows_s, iterrows = best_time(create_nba_team_dictionary_iterrows,
+                                             df, 1)
+            identical = json.dumps(iterrows) == json.dumps(columnar)
+            print(f"{n:>9} {1e6 * iterrows_s / n:>16.2f} "
+                  f"{1e6 * columnar_s / n:>16.2f} "
+                  f"{iterrows_s / columnar_s:>7.1f}x {str(identical):>9}")
+        else:
+            print(f"{n:>9} {'-':>16} {1e6 * columnar_s / n:>16.2f} "
+                  f"{'-':>8} {'-':>9}")
@@ -10,4 +10,8 @@ service_account_file_path = os.getenv('GCP_SERVICE_ACCOUNT_KEY')
 api_server_url = os.getenv('API_SERVICE_URL')
 client_id = os.getenv("SEATGEEK_CLIENT_ID")
 secret_id = os.getenv("SECRET_ID")
+# Where artifacts are published: gcs (the bucket) or local (a directory
+# standing in for it, to run and benchmark the pipeline offline)
+storage_backend = os.getenv('STORAGE_BACKEND', 'gcs').lower()
+local_storage_dir = os.getenv('LOCAL_STORAGE_DIR', '.cache/bucket')
 file_name_prefix = 'msds692-group/'
\ No newline at end of file
@@ -0,0 +1,37 @@
+import functools
+import gzip
+
+from google.oauth2 import service_account
+from google.cloud import storage
+
+# The dashboard's read side of api_server/server/gcs_client.py: the
+# streamlit image is built from this directory alone, so it can't
+# import the server package.
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+@functools.lru_cache(maxsize=None)
+def get_storage_client(project_id: str,
+                       service_account_key: str) -> storage.Client:
+    '''
+    Process-wide storage client for a (project, service account key).
+    The key file is read and the client built on first use only;
+    later calls reuse the client, its refreshed access token and its
+    pooled HTTP connections.
+    '''
+    credentials = service_account.Credentials.\
+        from_service_account_file(service_account_key)
+    return storage.Client(project=project_id, credentials=credentials)
+
+
+def download_blob_bytes(blob) -> bytes:
+    '''
+    Downloads an object as stored, without GCS decompressing it on the
+    way, and gunzips it if it was uploaded gzip-compressed, so callers
+    get the original bytes whichever way it was published.
+    '''
+    data = blob.download_as_bytes(raw_download=True)
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    return data
@@ -1,9 +1,10 @@
 import json
 from pathlib import Path
-from google.oauth2 import service_account
-from google.cloud import storage
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
 import statsmodels.formula.api as smf
 
@@ -18,20 +19,67 @@ import matplotlib.pyplot as plt
 
 from mizani.formatters import percent_format
 from define_variables import *
+from gcs_client import *
+from storage_backends import *
 
-def retrieve_data_from_gcs(service_account_key: str,
-                           project_id: str,
-                           bucket_name: str,
-                           file_name: str
-                           ) -> dict:
-    credentials = service_account.Credentials.from_service_account_file(
-        service_account_key)
-    client = storage.Client(project=project_id,
-                            credentials=credentials)
-    bucket = client.bucket(bucket_name)
-    blob = bucket.blob(file_name)
-    content = blob.download_as_text()
-    return content
+@st.cache_resource
+def open_storage_backend() -> StorageBackend:
+    """
+    One backend for the app's lifetime rather than per rerun, so its
+    read cache survives reruns: unchanged objects aren't downloaded
+    again.
+    """
+    return make_storage_backend(storage_backend,
+                                project_id=project_id,
+                                service_account_key=service_account_file_path,
+                                bucket_name=bucket_name,
+                                local_dir=local_storage_dir)
+
+
+def retrieve_data_from_gcs(store: StorageBackend, file_name: str) -> str:
+    data = store.read_bytes_cached(file_name)
+    return None if data is None else data.decode("utf-8")
+
+
+def retrieve_game_data_from_gcs(store: StorageBackend) -> tuple:
+    """
+    Loads the home and away game tables from the per-season parquet
+    files listed in nba_game_data/_manifest.json, which keep the
+    dtypes the API server built them with. Falls back to the csv
+    files when no parquet has been published yet.
+    """
+    manifest = store.read_bytes_cached("nba_game_data/_manifest.json")
+    if manifest is None:
+        home_csv = store.read_bytes_cached("all_nba_game_data_home.csv")
+        away_csv = store.read_bytes_cached("all_nba_game_data_away.csv")
+        return (pd.read_csv(io.BytesIO(home_csv)),
+                pd.read_csv(io.BytesIO(away_csv)))
+    manifest = json.loads(manifest)
+
+    def read_parquet(file_name):
+        return pq.read_table(io.BytesIO(store.read_bytes_cached(file_name)))
+
+    tables = []
+    for venue in ("home", "away"):
+        files = [entry[venue]["file"]
+                 for _, entry in sorted(manifest["seasons"].items())]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            df = pa.concat_tables(executor.map(read_parquet, files)).to_pandas()
+        # GAME_ID is stored zero-padded; the tabs expect the integer
+        # ids read_csv produces
+        df["GAME_ID"] = df["GAME_ID"].astype("int64")
+        tables.append(df)
+    return tuple(tables)
+
+
+def retrieve_game_facts_from_gcs(store: StorageBackend):
+    """
+    Loads game_facts.parquet, one row per game and team with the
+    attendance already joined, indexed by (TEAM_ID, SEASON_YEAR,
+    GAME_ID). Returns None when it hasn't been published yet.
+    """
+    data = store.read_bytes_cached("game_facts.parquet")
+    return None if data is None else pd.read_parquet(io.BytesIO(data))
 
 
 TEAM_META = {
@@ -123,24 +171,10 @@ def load_popularity_data(path: Path) -> pd.DataFrame:
 
 if __name__ == "__main__":
 
-    TEAM_DATA_PATH = retrieve_data_from_gcs(service_account_file_path,
-                                        project_id,
-                                        bucket_name,
-                                        'nba_attendance_data.json')
-    POPULARITY_DATA_PATH = retrieve_data_from_gcs(service_account_file_path,
-                                        project_id,
-                                        bucket_name,
-                                        'seatgeek_api_data.json')
-    HOME_CSV = retrieve_data_from_gcs(service_account_file_path,
-                                        project_id,
-                                        bucket_name, 
-                                        "all_nba_game_data_home.csv")
-    
-    
-    AWAY_CSV = retrieve_data_from_gcs(service_account_file_path,
-                                        project_id,
-                                        bucket_name,
-                                        "all_nba_game_data_away.csv")
+    STORE = open_storage_backend()
+    TEAM_DATA_PATH = retrieve_data_from_gcs(STORE, 'nba_attendance_data.json')
+    POPULARITY_DATA_PATH = retrieve_data_from_gcs(STORE, 'seatgeek_api_data.json')
+    GAME_FACTS_DF = retrieve_game_facts_from_gcs(STORE)
 
     st.set_page_config(
         page_title="NBA Home Court Advantage Analysis",
@@ -434,15 +468,27 @@ if __name__ == "__main__":
         st.subheader("Statistical Models & Regression Analysis")
         st.markdown("Dive deep into the statistical relationships between home advantage, attendance, and win rates.")
 
-        # turn blob content into DataFrames / dicts
-        home_df = pd.read_csv(io.StringIO(HOME_CSV))
-        away_df = pd.read_csv(io.StringIO(AWAY_CSV))
-
-        # fetch games-with-ids
-        GAMES_IDS_JSON = retrieve_data_from_gcs(
-            service_account_file_path, project_id, bucket_name, "get_game_ids.json"
-        )
-        games_with_ids = json.loads(GAMES_IDS_JSON)
+        def join_attendance(home, games_json_dict):
+            games_list = []
+            for _, games in games_json_dict.items():
+                games_list.extend(games)
+            json_df = pd.DataFrame(games_list, columns=['Date','Attendance','Points','HomeWin','GameID']).dropna()
+            json_df['GAME_ID'] = json_df.pop('GameID').astype('int64')
+            return pd.merge(home, json_df, on='GAME_ID', how='inner')
+
+        if GAME_FACTS_DF is not None:
+            # one row per game and team, attendance joined at publish time
+            facts = GAME_FACTS_DF.reset_index()
+            home_df = facts[facts['HOME']]
+            away_df = facts[~facts['HOME']]
+            home_attendance_df = home_df[home_df['ATTENDANCE'].notna()].copy()
+            home_attendance_df['Attendance'] = home_attendance_df.pop('ATTENDANCE').astype('float64')
+        else:
+            # the game tables are only needed without published game facts
+            home_df, away_df = retrieve_game_data_from_gcs(STORE)
+            # fetch games-with-ids
+            GAMES_IDS_JSON = retrieve_data_from_gcs(STORE, "get_game_ids.json")
+            home_attendance_df = join_attendance(home_df, json.loads(GAMES_IDS_JSON))
 
         def logistic_regression(home, away):
             home = home.copy(); away = away.copy()
@@ -481,14 +527,7 @@ if __name__ == "__main__":
             st.pyplot(fig)
             plt.close(fig)
 
-        def winrate_attendance_comparison(home, games_json_dict):
-            games_list = []
-            for _, games in games_json_dict.items():
-                games_list.extend(games)
-            json_df = pd.DataFrame(games_list, columns=['Date','Attendance','Points','HomeWin','GAME_ID']).dropna()
-            json_df['GAME_ID'] = json_df['GAME_ID'].astype('int64')
-
-            df = pd.merge(home, json_df, on='GAME_ID', how='inner')
+        def winrate_attendance_comparison(df):
             home_stats = df.groupby('TEAM_ID').agg({
                 'SEASON_WINRATE':'mean', 'HOME_WINRATE':'mean', 'Attendance':'mean'
             }).round(3)
@@ -518,4 +557,4 @@ if __name__ == "__main__":
         # --- actually run Tab 4 content ---
         logistic_regression(home_df, away_df)
         make_bar_chart(home_df, away_df)
-        winrate_attendance_comparison(home_df, games_with_ids)
\ No newline at end of file
+        winrate_attendance_comparison(home_attendance_df)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import gzip
+import os
+
+from google.api_core.exceptions import NotFound
+
+from gcs_client import GZIP_MAGIC, download_blob_bytes, get_storage_client
+
+# The read side of api_server/server/storage_backends.py, which is all
+# the dashboard uses: the streamlit image is built from this directory
+# alone, so it can't import the server package. Writes, freshness
+# checks and the lease operations stay with the API server.
+
+
+class StorageBackend:
+    '''
+    Where the dashboard reads the pipeline's artifacts from, addressed
+    by object name (e.g. "game_facts.parquet"). Reads gunzip objects
+    that were published gzip-compressed, so callers always get the
+    original bytes. read_bytes_cached only downloads an object again
+    once its version changed.
+
+    Backends implement version and read_bytes.
+    '''
+
+    def __init__(self):
+        self._read_cache = {}
+
+    def read_text(self, name: str):
+        data = self.read_bytes(name)
+        return None if data is None else data.decode("utf-8")
+
+    def read_bytes_cached(self, name: str):
+        '''
+        Like read_bytes, but keeps the content along with the object's
+        version and only downloads it again once the version changed,
+        so rereading an unchanged object costs a metadata lookup.
+        '''
+        version = self.version(name)
+        if version is None:
+            self._read_cache.pop(name, None)
+            return None
+        cached = self._read_cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = self.read_bytes(name)
+        if data is not None:
+            self._read_cache[name] = (version, data)
+        return data
+
+
+class GcsStorage(StorageBackend):
+    '''
+    Objects in a GCS bucket, read with the process-wide client of the
+    project and service account key. An object's version is its
+    generation.
+    '''
+
+    def __init__(self, project_id: str, service_account_key: str,
+                 bucket_name: str):
+        super().__init__()
+        self.project_id = project_id
+        self.service_account_key = service_account_key
+        self.bucket_name = bucket_name
+
+    def __repr__(self):
+        return f"GcsStorage(gs://{self.bucket_name})"
+
+    def _bucket(self):
+        client = get_storage_client(self.project_id, self.service_account_key)
+        return client.bucket(self.bucket_name)
+
+    def version(self, name: str):
+        blob = self._bucket().get_blob(name)
+        return None if blob is None else blob.generation
+
+    def read_bytes(self, name: str):
+        '''
+        The object's content, or None if it doesn't exist.
+        '''
+        try:
+            return download_blob_bytes(self._bucket().blob(name))
+        except NotFound:
+            return None
+
+
+class LocalStorage(StorageBackend):
+    '''
+    Objects as files under root_dir, with the object name as relative
+    path, as the API server's LocalStorage writes them. A file's
+    inode, modification time and size are its version.
+    '''
+
+    def __init__(self, root_dir: str):
+        super().__init__()
+        self.root_dir = root_dir
+
+    def __repr__(self):
+        return f"LocalStorage({self.root_dir})"
+
+    def version(self, name: str):
+        try:
+            stat = os.stat(os.path.join(self.root_dir, name))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def read_bytes(self, name: str):
+        '''
+        The object's content, or None if it doesn't exist.
+        '''
+        try:
+            with open(os.path.join(self.root_dir, name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if data[:2] == GZIP_MAGIC:
+            data = gzip.decompress(data)
+        return data
+
+
+def make_storage_backend(kind: str, project_id: str = None,
+                         service_account_key: str = None,
+                         bucket_name: str = None,
+                         local_dir: str = None) -> StorageBackend:
+    '''
+    The backend selected by STORAGE_BACKEND: "gcs" for the bucket,
+    "local" for a directory standing in for it.
+    '''
+    if kind == "gcs":
+        return GcsStorage(project_id, service_account_key, bucket_name)
+    if kind == "local":
+        return LocalStorage(local_dir)
+    raise ValueError(f"Unknown storage backend {kind!r}, expected gcs or local")